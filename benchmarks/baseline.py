@@ -0,0 +1,160 @@
+"""The query classes' post-processing as it was before results were shared
+through snapshots and small results processed in plain Python, for
+bench_processing to time the current paths against.
+
+Each benchmark has a pair of functions: the first turns bench_processing's
+synthetic rows into what the original queries returned, in place of MySQL,
+and is not timed; the second is the original processing of those results,
+including building their DataFrames, and is timed.
+"""
+from collections import Counter
+import pandas as pd
+from flask_babel import gettext
+from data_explorer.config import Config
+from data_explorer.course_routes.queries import comment_queries, snapshot_queries
+from data_explorer.course_routes.registry import _clean_title
+
+
+def rating_results(rows):
+	"""Rows (question, month, average, count) of Ratings' query, and rows
+	(month, average, count) of OverallSatisfaction's, for THIS_YEAR.
+	"""
+	this_year = [row[1:] for row in rows if row[0] == Config.THIS_YEAR]
+	ratings = [row for row in this_year if row[0] in snapshot_queries.RATING_QUESTIONS]
+	satisfaction = [row[1:] for row in this_year if row[0] == snapshot_queries.NANOS_SATISFACTION_QUESTION]
+	return ratings, satisfaction
+
+
+def ratings(results):
+	"""Ratings._process_ratings and OverallSatisfaction._process_raw."""
+	rating_rows, satisfaction_rows = results
+	data = pd.DataFrame(rating_rows, columns=['original_question', 'month', 'average', 'count'])
+	results_processed = {}
+	if not data.empty:
+		questions = data.loc[:, 'original_question'].unique()
+		for question in questions:
+			data_filtered = data.loc[data['original_question'] == question, ['month', 'average', 'count']]
+			results_processed[question] = _get_monthly_values(data_filtered)
+	data = pd.DataFrame(satisfaction_rows, columns=['month', 'average', 'count'])
+	satisfaction = [] if data.empty else _get_monthly_values(data)
+	return results_processed, satisfaction
+
+
+def _get_monthly_values(df):
+	months = ['April', 'May', 'June', 'July', 'August', 'September',
+			  'October', 'November', 'December', 'January', 'February', 'March']
+	monthly_values = []
+	for month in months:
+		df_month = df.loc[df['month'] == month, :]
+		try:
+			average = float(round(df_month.iloc[0]['average'], 2))
+			count = int(df_month.iloc[0]['count'])
+		except IndexError:
+			average = None
+			count = None
+		monthly_values.append({'y': average, 'count': count})
+	return monthly_values
+
+
+def categorical_results(rows):
+	"""Rows (question, answer, count), as the query is unchanged."""
+	return rows
+
+
+def categorical(results):
+	"""Categorical._load_categorical for each question."""
+	data = pd.DataFrame(results, columns=['original_question', 'text_answer', 'count'])
+	results_processed = {}
+	for attr, question in comment_queries.Categorical.questions.items():
+		data_filtered = data.loc[data['original_question'] == question, :]
+		answers = []
+		for row in data_filtered.itertuples(index=False):
+			answers.append({'name': row[1], 'y': row[2]})
+		results_processed[attr] = answers if answers else [{'name': gettext('No response'), 'y': 1}]
+	return results_processed
+
+
+def comment_results(rows):
+	"""Rows without survey_id, which the query didn't select."""
+	return [row[:6] for row in rows]
+
+
+def comments(results):
+	"""Comments._load_raw's DataFrame and Comments._process_raw."""
+	raw = pd.DataFrame(results, columns=['text_answer', 'offering_city', 'fiscal_year', 'quarter', 'stars', 'nanos'])
+	raw['stars'] = raw['stars'].fillna(0)
+	if raw.empty:
+		return False
+	# _format_title is unchanged
+	format_title = comment_queries.Comments('en', 'X', 'general', '', '', len(results))._format_title
+	results_processed = []
+	for row in raw.itertuples(index=False):
+		results_processed.append((row[0], format_title(row[1]), row[2], row[3], int(row[4]), row[5]))
+	return results_processed
+
+
+def location_results(rows):
+	"""Rows (region, province, city, count) of OfferingLocations' GROUP BY
+	query for THIS_YEAR.
+	"""
+	counts = Counter((row['offering_region_en'], row['offering_province_en'], row['offering_city_en'])
+					 for row in rows if row['fiscal_year'] == Config.THIS_YEAR
+					 and row['offering_status'] in snapshot_queries.ACTIVE_STATUSES)
+	return [(*key, count) for (key, count) in sorted(counts.items())]
+
+
+def offering_locations(results):
+	"""OfferingLocations' region, province, and city drilldowns."""
+	data = pd.DataFrame(results, columns=['offering_region', 'offering_province', 'offering_city', 'count'])
+	# Regions
+	counts = data.groupby('offering_region', as_index=False).sum()
+	counts = dict(counts.values.tolist())
+	regions = [gettext('Atlantic'), gettext('NCR'), gettext('Ontario Region'), gettext('Pacific'),
+			   gettext('Prairie'), gettext('Québec Region'), gettext('Outside Canada')]
+	regions = [{'name': region, 'drilldown': region, 'y': counts.get(region, 0)} for region in regions]
+	# Provinces
+	counts = data.groupby(['offering_region', 'offering_province'], as_index=False).sum()
+	provinces = {}
+	for region in data.loc[:, 'offering_region'].unique():
+		province_counts = counts.loc[counts['offering_region'] == region, ['offering_province', 'count']].values.tolist()
+		provinces[region] = [{'name': list_[0], 'drilldown': list_[0], 'y': list_[1]} for list_ in province_counts]
+	# Cities
+	counts = data.groupby(['offering_province', 'offering_city'], as_index=False).sum()
+	cities = {}
+	for province in data.loc[:, 'offering_province'].unique():
+		cities[province] = counts.loc[counts['offering_province'] == province, ['offering_city', 'count']].values.tolist()
+	return regions, provinces, cities
+
+
+def course_results(rows):
+	"""Rows (provider, business_line, course_code, course_title), as the
+	query is unchanged.
+	"""
+	return rows
+
+
+def course_list(results):
+	"""CourseList's business lines, providers, and nested dicts."""
+	data = pd.DataFrame(results, columns=['provider', 'business_line', 'course_code', 'course_title'])
+	business_lines = data.loc[:, 'business_line']
+	business_lines.replace(['', None, 'None'], gettext('<awaiting mapping>'), inplace=True)
+	business_lines = business_lines.unique()
+	business_lines.sort()
+	providers = data.loc[:, 'provider']
+	providers.replace(['', None, 'None'], gettext('<awaiting mapping>'), inplace=True)
+	providers = providers.unique()
+	providers.sort()
+	nested = {}
+	for business_line in business_lines:
+		business_line_courses = {}
+		for provider in providers:
+			business_line_bool = data['business_line'] == business_line
+			provider_bool = data['provider'] == provider
+			courses = data.loc[business_line_bool & provider_bool, ['course_code', 'course_title']].values.tolist()
+			courses = sorted(courses)
+			courses = [[course[0], _clean_title(course[1])] for course in courses]
+			if courses:
+				business_line_courses[provider] = courses
+		if business_line_courses:
+			nested[business_line] = business_line_courses
+	return nested
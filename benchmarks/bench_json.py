@@ -0,0 +1,61 @@
+"""Serialization time and payload size of typical chart data embedded by
+json_filter and of typical API responses, before (json.dumps, and
+pretty-printed jsonify for the API) and with each serialization backend.
+orjson is skipped if not installed:
+
+	python -m benchmarks.bench_json
+"""
+import json
+import random
+import sys
+from benchmarks import bench_processing
+from benchmarks.common import bench_app, cpu_time, print_table
+from data_explorer import serialization
+from data_explorer.config import Config
+from data_explorer.course_routes.queries import snapshot_queries
+
+
+def payloads():
+	"""Dict mapping name to (use, payload) built from synthetic rows by the
+	query classes themselves.
+	"""
+	rng = random.Random(0)
+	offerings = bench_processing.offering_rows(rng, 2000)
+	snapshot = snapshot_queries.OfferingSnapshot('X')
+	snapshot.rows = offerings
+	return {
+		'offering map': ('filter', snapshot.city_counts('en', Config.THIS_YEAR)),
+		'location drilldowns': ('filter', bench_processing.offering_locations(offerings)),
+		'monthly rating series': ('filter', bench_processing.ratings(bench_processing.rating_rows(rng, 300))),
+		'schedule (dates)': ('filter', snapshot.scheduled('en', Config.LAST_YEAR)[:200]),
+		'comments page': ('api', bench_processing.comments(bench_processing.comment_rows(rng, 100))),
+		'rating counts': ('api', {1: 4, 2: 8, 3: 15, 4: 16, 5: 23})
+	}
+
+
+def before(use):
+	"""How each use serialized before: json.dumps for the filter, and
+	Flask's pretty-printed jsonify for the API.
+	"""
+	if use == 'filter':
+		return lambda obj: json.dumps(obj, default=serialization.default).encode('utf-8')
+	return lambda obj: (json.dumps(obj, indent=2, separators=(', ', ': '), ensure_ascii=False,
+								   default=serialization.default) + '\n').encode('utf-8')
+
+
+def main():
+	app = bench_app(PANDAS_ROW_THRESHOLD=sys.maxsize)
+	backends = ['json']
+	if serialization.orjson_available():
+		backends.append('orjson')
+	table = []
+	with app.test_request_context():
+		for name, (use, payload) in payloads().items():
+			variants = [('before', before(use))] + [(backend, serialization.get_backend(backend)) for backend in backends]
+			for variant, dumps in variants:
+				table.append([name, use, variant, '{0:.1f}'.format(cpu_time(lambda: dumps(payload))), len(dumps(payload))])
+	print_table(['payload', 'use', 'backend', 'us', 'bytes'], table)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,193 @@
+"""CPU time of the query classes' post-processing on synthetic rows, in
+plain Python, with pandas, and as originally implemented (see baseline),
+for a few result sizes. Checks that the plain Python and pandas paths give
+the same output, and shows whether it matches the original's. The offering
+dashboards were aggregated by MySQL originally, so have no baseline here.
+No DB needed:
+
+	python -m benchmarks.bench_processing [--sizes 20 100 1000]
+"""
+import argparse
+import datetime
+import random
+import sys
+from decimal import Decimal
+from benchmarks import baseline
+from benchmarks.common import bench_app, cpu_time, print_table
+from data_explorer.config import Config
+from data_explorer.course_routes.queries import browse_queries, comment_queries, dashboard_offering_queries, snapshot_queries
+
+REGIONS = [('Atlantic', ['Nova Scotia', 'New Brunswick']), ('NCR', ['Ontario', 'Quebec']),
+		   ('Ontario Region', ['Ontario']), ('Pacific', ['British Columbia']),
+		   ('Prairie', ['Alberta', 'Manitoba']), ('Québec Region', ['Quebec'])]
+STATUSES = ['Open - Normal', 'Delivered - Normal', 'Cancelled - Normal', None]
+
+
+def rating_rows(rng, n):
+	"""Grouped rows (fiscal_year, question, month, average, count)."""
+	questions = snapshot_queries.RATING_QUESTIONS + [snapshot_queries.NANOS_SATISFACTION_QUESTION]
+	rows = []
+	i = 0
+	while len(rows) < n:
+		question = questions[i % len(questions)] if i < len(questions) else 'Question {0}'.format(i)
+		for fiscal_year in (Config.LAST_YEAR, Config.THIS_YEAR):
+			for month in rng.sample(snapshot_queries.MONTHS, 9):
+				rows.append((fiscal_year, question, month, Decimal(rng.randint(100, 1000)) / 100, rng.randint(1, 50)))
+		i += 1
+	return rows[:n]
+
+
+def categorical_rows(rng, n):
+	"""Grouped rows (question, answer, count) ordered by question."""
+	questions = list(comment_queries.Categorical.questions.values())
+	rows = [(questions[i % len(questions)], 'Answer {0}'.format(i), rng.randint(1, 100)) for i in range(n)]
+	return sorted(rows, key=lambda row: row[0])
+
+
+def comment_rows(rng, n):
+	"""A page of comments (text, city, fiscal_year, quarter, stars, nanos, survey_id)."""
+	return [('Comment {0}'.format(i), rng.choice(['ottawa', 'gatineau', "st. john's"]), Config.THIS_YEAR,
+			 'Q{0}'.format(rng.randint(1, 4)), rng.choice([1, 2, 3, 4, 5, None]), rng.choice(['Y', 'N']), n - i)
+			for i in range(n)]
+
+
+def offering_rows(rng, n):
+	"""Offering snapshot rows as dicts."""
+	rows = []
+	for i in range(n):
+		region, provinces = rng.choice(REGIONS)
+		province = rng.choice(provinces)
+		city = '{0} {1}'.format(province, rng.randint(1, 8))
+		lat = None if rng.random() < 0.05 else Decimal('45.4') + rng.randint(0, 99)
+		row = dict.fromkeys(snapshot_queries.OfferingSnapshot.columns)
+		row.update({
+			'offering_id': i,
+			'fiscal_year': rng.choice([Config.LAST_YEAR, Config.THIS_YEAR]),
+			'quarter': 'Q{0}'.format(rng.randint(1, 4)),
+			'offering_status': rng.choice(STATUSES),
+			'client': rng.choice([None, '', 'ESDC']),
+			'offering_language': rng.choice(['English', 'French', 'Bilingual']),
+			'offering_region_en': region,
+			'offering_province_en': province,
+			'offering_city_en': city,
+			'offering_lat': lat,
+			'offering_lng': None if lat is None else Decimal('-75.7'),
+			'start_date': datetime.date(2019, 4, 1) + datetime.timedelta(days=i % 365)
+		})
+		rows.append(row)
+	return rows
+
+
+def course_rows(rng, n):
+	"""Browse rows (provider, business_line, course_code, course_title)."""
+	providers = ['CSPS', 'ESDC', None, '']
+	lines = ['Leadership', 'Digital', None, 'None']
+	return [(rng.choice(providers), rng.choice(lines), 'C{0:03d}'.format(i), 'Course title {0} (C{0:03d})'.format(i))
+			for i in rng.sample(range(n * 2), n)]
+
+
+def ratings(rows):
+	snapshot = snapshot_queries.RatingSnapshot('X')
+	snapshot.rows = rows
+	snapshot.series = snapshot._pivot_frame() if snapshot_queries.use_pandas(rows) else snapshot._pivot()
+	return snapshot.ratings(Config.THIS_YEAR), snapshot.monthly_values(Config.THIS_YEAR, snapshot_queries.NANOS_SATISFACTION_QUESTION)
+
+
+def categorical(rows):
+	results = comment_queries.Categorical('en', 'X')
+	results.categorical_data = rows
+	answers = results._group_answers()
+	return {attr: results._load_categorical(answers, question) for (attr, question) in results.questions.items()}
+
+
+def comments(rows):
+	results = comment_queries.Comments('en', 'X', 'general', '', '', len(rows))
+	results.raw = rows
+	return results._process_raw()
+
+
+def _offering_snapshot(rows):
+	snapshot = snapshot_queries.OfferingSnapshot('X')
+	snapshot.rows = rows
+	snapshot.large = snapshot_queries.use_pandas(rows)
+	return snapshot
+
+
+def offering_locations(rows):
+	results = dashboard_offering_queries.OfferingLocations('en', Config.THIS_YEAR, 'X')
+	results.data = _offering_snapshot(rows).location_counts('en', Config.THIS_YEAR)
+	results._region_drilldown()
+	results._province_drilldown()
+	results._city_drilldown()
+	return results.regions, results.provinces, results.cities
+
+
+def offering_dashboards(rows):
+	snapshot = _offering_snapshot(rows)
+	fiscal_year = Config.THIS_YEAR
+	return (snapshot.status_counts(fiscal_year), snapshot.client_requests(fiscal_year),
+			snapshot.region_and_quarter_counts('en', fiscal_year), snapshot.language_counts(fiscal_year),
+			snapshot.cancelled_percent(fiscal_year), snapshot.city_counts('en', fiscal_year))
+
+
+def course_list(rows):
+	results = browse_queries.CourseList('en')
+	results.rows = rows
+	results._load_nested()
+	return results.nested
+
+
+# Class(es) benchmarked, row generator, processing, and the original's
+# query results and processing
+BENCHMARKS = [
+	('Ratings/OverallSatisfaction', rating_rows, ratings, (baseline.rating_results, baseline.ratings)),
+	('Categorical', categorical_rows, categorical, (baseline.categorical_results, baseline.categorical)),
+	('Comments', comment_rows, comments, (baseline.comment_results, baseline.comments)),
+	('OfferingLocations', offering_rows, offering_locations, (baseline.location_results, baseline.offering_locations)),
+	('OfferingSnapshot dashboards', offering_rows, offering_dashboards, None),
+	('CourseList', course_rows, course_list, (baseline.course_results, baseline.course_list))
+]
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+	parser.add_argument('--sizes', type=int, nargs='+', default=[20, 100, 1000])
+	args = parser.parse_args(argv)
+	app = bench_app()
+	threshold = app.config['PANDAS_ROW_THRESHOLD']
+	table = []
+	mismatches = 0
+	with app.test_request_context():
+		for name, make_rows, process, original in BENCHMARKS:
+			for size in args.sizes:
+				rows = make_rows(random.Random(size), size)
+				timings = {}
+				outputs = {}
+				# Force each path via the threshold
+				for path, path_threshold in (('pandas', -1), ('python', sys.maxsize)):
+					app.config['PANDAS_ROW_THRESHOLD'] = path_threshold
+					outputs[path] = process(rows)
+					timings[path] = cpu_time(lambda: process(rows))
+				app.config['PANDAS_ROW_THRESHOLD'] = threshold
+				same = outputs['pandas'] == outputs['python']
+				mismatches += not same
+				# Path taken at the configured threshold
+				current = timings['pandas'] if size > threshold else timings['python']
+				if original is None:
+					baseline_cells = ['-', '-', '-']
+				else:
+					results_for, process_original = original
+					results = results_for(rows)
+					timings['baseline'] = cpu_time(lambda: process_original(results))
+					baseline_cells = ['{0:.1f}'.format(timings['baseline']), '{0:.1f}x'.format(timings['baseline'] / current),
+									  'yes' if process_original(results) == outputs['python'] else 'NO']
+				table.append([name, size, baseline_cells[0], '{0:.1f}'.format(timings['pandas']), '{0:.1f}'.format(timings['python']),
+							  baseline_cells[1], '{0:.1f}x'.format(timings['pandas'] / timings['python']),
+							  'yes' if same else 'NO', baseline_cells[2]])
+	print_table(['class', 'rows', 'baseline us', 'pandas us', 'python us', 'vs baseline', 'pandas/python',
+				 'same output', 'as baseline'], table)
+	return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,50 @@
+"""Helpers shared by the micro-benchmarks. Run each benchmark from the
+repository root as a module e.g. `python -m benchmarks.bench_processing`.
+"""
+import time
+from flask import Flask
+from flask_babel import Babel
+from data_explorer.config import Config
+
+
+def bench_app(**config):
+	"""Minimal app, without DB or blueprints, in whose request context the
+	query classes can process synthetic rows.
+	"""
+	app = Flask('data_explorer')
+	app.config.from_object(Config)
+	app.config.update(config)
+	Babel(app)
+	return app
+
+
+def cpu_time(func, repeat=5, min_time=0.2):
+	"""Best CPU time per call of func, in microseconds, over repeat runs of
+	enough calls to last at least min_time seconds.
+	"""
+	number = 1
+	while True:
+		start = time.process_time()
+		for _ in range(number):
+			func()
+		elapsed = time.process_time() - start
+		if elapsed >= min_time:
+			break
+		number *= 2
+	best = elapsed
+	for _ in range(repeat - 1):
+		start = time.process_time()
+		for _ in range(number):
+			func()
+		best = min(best, time.process_time() - start)
+	return best / number * 1e6
+
+
+def print_table(headers, rows):
+	"""Print rows as a plain-text table with right-aligned columns."""
+	rows = [[str(cell) for cell in row] for row in rows]
+	widths = [max(len(row[i]) for row in [headers] + rows) for i in range(len(headers))]
+	print('  '.join(header.ljust(width) for (header, width) in zip(headers, widths)))
+	print('  '.join('-' * width for width in widths))
+	for row in rows:
+		print('  '.join([row[0].ljust(widths[0])] + [cell.rjust(width) for (cell, width) in zip(row[1:], widths[1:])]))
@@ -1,7 +1,7 @@
-import json
 from flask import Flask, render_template, request
 from flask_httpauth import HTTPBasicAuth
 from flask_babel import Babel
+from data_explorer import serialization
 from data_explorer.config import Config
 
 # Instantiate login
@@ -21,6 +21,9 @@ def not_found(e):
 
 # Application factory
 def create_app(config_class=Config):
+	# Time each stage of startup; see startup.StartupReport
+	from data_explorer.startup import StartupReport
+	startup_report = StartupReport()
 	app = Flask(__name__)
 	app.config.from_object(config_class)
 	
@@ -29,9 +32,10 @@ def create_app(config_class=Config):
 	app.jinja_env.filters['zip'] = zip
 	
 	
-	# Add func to convert Python data structures to JSON
+	# Add func to convert Python data structures to JSON; compact and via the
+	# configured backend e.g. orjson
 	def json_filter(my_object):
-		return json.dumps(my_object)
+		return serialization.dumps(my_object)
 	app.jinja_env.filters['json_filter'] = json_filter
 	
 	
@@ -43,9 +47,14 @@ def create_app(config_class=Config):
 		return nested_len
 	app.jinja_env.filters['nested_dict_len'] = nested_dict_len
 	
-	# Register database
-	from data_explorer import db
+	# Register database and its per-request query instrumentation
+	from data_explorer import db, instrumentation
 	db.init_app(app)
+	instrumentation.init_app(app)
+	
+	# Register response compression
+	from data_explorer import compression
+	compression.init_app(app)
 	
 	
 	# Register plugins
@@ -66,13 +75,23 @@ def create_app(config_class=Config):
 		# Only allow 'en' and 'fr' to be passed to app
 		return 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
 	
+	# Load the in-memory course registry used to validate course codes
+	from data_explorer.course_routes import registry
+	with startup_report.stage('load course registry'):
+		registry.init_app(app)
+	
 	# Register blueprints
-	from data_explorer.main_routes.routes import main
-	from data_explorer.course_routes.routes import course
-	from data_explorer.api_routes.routes import api
-	from data_explorer.download_routes.routes import downloads
+	with startup_report.stage('import data_explorer.main_routes'):
+		from data_explorer.main_routes.routes import main
+	with startup_report.stage('import data_explorer.course_routes'):
+		from data_explorer.course_routes.routes import course
+	with startup_report.stage('import data_explorer.api_routes'):
+		from data_explorer.api_routes.routes import api
+	with startup_report.stage('import data_explorer.download_routes'):
+		from data_explorer.download_routes.routes import downloads
 	app.register_blueprint(main)
 	app.register_blueprint(course)
 	app.register_blueprint(api)
 	app.register_blueprint(downloads)
+	startup_report.init_app(app)
 	return app
@@ -1,6 +1,10 @@
-from flask import Blueprint, jsonify, render_template, request
-from data_explorer import auth
-from data_explorer.course_routes.queries import comment_queries
+from flask import Blueprint, render_template, request, url_for
+from data_explorer import auth, cache
+from data_explorer.course_routes.queries import calendar_queries, comment_queries, national_map_queries
+from data_explorer.course_routes.registry import get_registry
+from data_explorer.course_routes.utils import parse_date, request_today
+from data_explorer.etags import conditional
+from data_explorer.serialization import jsonify
 
 # Instantiate blueprint
 api = Blueprint('api', __name__)
@@ -12,9 +16,22 @@ QUESTION_DICT = {
 	'technical': 'Comment - Technical'
 }
 
+# Number of comments per page returned by default and at most
+COMMENTS_DEFAULT_LIMIT = 20
+COMMENTS_MAX_LIMIT = 100
+
+# Filters of the Calendar page's queries taking text and true/false
+CALENDAR_TEXT_FILTERS = ['region', 'status', 'language', 'course_code', 'instructor_name', 'business_line']
+CALENDAR_FLAG_FILTERS = ['exclude_cancelled', 'clients_only']
+
+# Number of typeahead results returned by default and at most
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+
 
 @api.route('/api/v1/counts/<string:short_question>/<string:course_code>')
 @auth.login_required
+@conditional
 def counts(short_question, course_code):
 	"""Return number of comments by star for a given course code, question,
 	and fiscal year.
@@ -33,9 +50,13 @@ def counts(short_question, course_code):
 
 @api.route('/api/v1/comments/<string:short_question>/<string:course_code>')
 @auth.login_required
+@conditional
 def comments(short_question, course_code):
-	"""Return all comments of a given type (e.g. general comments) for a
-	given course code.
+	"""Return a page of comments of a given type (e.g. general comments)
+	for a given course code as a list. Unless on the last page, the token
+	to pass as cursor to get the next page is sent in header X-Next-Cursor,
+	and the next page's URL in header Link; if html=true, the token is also
+	in key 'next_cursor'.
 	"""
 	course_code = course_code.upper()
 	# Unpack arguments
@@ -49,10 +70,23 @@ def comments(short_question, course_code):
 	fiscal_year = request.args.get('fiscal_year', '')
 	# Stars
 	stars = request.args.get('stars', '')
-	# Limit
-	limit = request.args.get('limit', 999_999)
-	# Offset
-	offset = request.args.get('offset', 0)
+	# Page size
+	try:
+		limit = int(request.args.get('limit', COMMENTS_DEFAULT_LIMIT))
+	except ValueError:
+		limit = COMMENTS_DEFAULT_LIMIT
+	limit = max(1, min(limit, COMMENTS_MAX_LIMIT))
+	# Cursor from previous page
+	cursor = request.args.get('cursor', None) or None
+	if cursor is not None:
+		try:
+			comment_queries.decode_cursor(cursor)
+		except ValueError:
+			if lang == 'fr':
+				error_message = {'Erreur': 'Curseur invalide.'}
+			else:
+				error_message = {'Error': 'Invalid cursor.'}
+			return jsonify(error_message), 400
 	
 	# Run query; display error message in case of invalid arguments
 	if short_question in ['instructor', 'instructeur']:
@@ -63,7 +97,7 @@ def comments(short_question, course_code):
 		return jsonify(error_message), 410
 	else:
 		try:
-			comments = comment_queries.Comments(lang, course_code, QUESTION_DICT[short_question], fiscal_year, stars, limit, offset).load()
+			comments = comment_queries.Comments(lang, course_code, QUESTION_DICT[short_question], fiscal_year, stars, limit, cursor).load()
 		except Exception as e:
 			if lang == 'fr':
 				error_message = {'Erreur': 'Les commentaires de ce genre ne sont présentement pas recueillis dans nos sondages.'}
@@ -84,9 +118,150 @@ def comments(short_question, course_code):
 	# Allow both JSON and a rendered template to be returned
 	html = request.args.get('html', False)
 	if html == 'true':
-		return jsonify(data=render_template('/course-page/comments/comments-generator.html', ajax_comments=results))
+		response = jsonify(data=render_template('/course-page/comments/comments-generator.html', ajax_comments=results),
+						   next_cursor=comments.next_cursor)
 	else:
-		return jsonify(results)
+		# A list, as before pages were added, so that existing clients keep working
+		response = jsonify(results)
+	if comments.next_cursor is not None:
+		args = request.args.to_dict()
+		args['cursor'] = comments.next_cursor
+		next_url = url_for('api.comments', short_question=short_question, course_code=course_code, **args)
+		response.headers['X-Next-Cursor'] = comments.next_cursor
+		response.headers['Link'] = '<{0}>; rel="next"'.format(next_url)
+	return response
+
+
+@api.route('/api/v1/search/courses')
+@auth.login_required
+@conditional
+def search_courses():
+	"""Return the courses best matching q by code or title, ignoring case
+	and accents, as a list of objects with keys course_code and
+	course_title.
+	"""
+	# Only allow 'en' and 'fr' to be passed to app
+	lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
+	query = request.args.get('q', '')
+	try:
+		limit = int(request.args.get('limit', SEARCH_DEFAULT_LIMIT))
+	except ValueError:
+		limit = SEARCH_DEFAULT_LIMIT
+	limit = max(0, min(limit, SEARCH_MAX_LIMIT))
+	return jsonify(get_registry().search(query, lang, limit))
+
+
+@api.route('/api/v1/search/courses/random')
+@auth.login_required
+def random_course():
+	"""Return a random course code, for the home page's 'Make My Day'."""
+	course_code = get_registry().random_course_code()
+	if not course_code:
+		return jsonify({'Error': 'Not Found'}), 404
+	return jsonify({'course_code': course_code})
+
+
+@api.route('/api/v1/offerings')
+@auth.login_required
+@conditional
+def offerings():
+	"""Return the offerings running on at least one day from date_1 to
+	date_2 (YYYY-MM-DD) for the Calendar page, in key 'results'. Optionally
+	filtered by region, status, language, course_code, instructor_name,
+	business_line, exclude_cancelled, and clients_only.
+	"""
+	# Only allow 'en' and 'fr' to be passed to app
+	lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
+	try:
+		date_1, date_2 = _parse_date_range()
+	except ValueError:
+		return _date_range_error(lang)
+	return jsonify(results=calendar_queries.offerings(lang, date_1, date_2, request_today(), **_calendar_filters()))
+
+
+@api.route('/api/v1/offerings/counts-by-city')
+@auth.login_required
+@conditional
+def counts_by_city():
+	"""Return the number of offerings starting from date_1 to date_2
+	(YYYY-MM-DD) per city, with the city's offering_lat and offering_lng,
+	for the Calendar page's map, in key 'results'. Takes the same filters
+	as offerings.
+	"""
+	# Only allow 'en' and 'fr' to be passed to app
+	lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
+	try:
+		date_1, date_2 = _parse_date_range()
+	except ValueError:
+		return _date_range_error(lang)
+	return jsonify(results=calendar_queries.counts_by_city(lang, date_1, date_2, **_calendar_filters()))
+
+
+@api.route('/api/v1/national-map/<string:kind>')
+@auth.login_required
+@conditional
+def national_map(kind):
+	"""Return the learners or offerings of all courses binned by location,
+	optionally filtered by business_type, region, and year (a fiscal year
+	e.g. 2019-20), as lists of form [latitude, longitude, count] in key
+	'bins', with the values each filter accepts in key 'filters'.
+	"""
+	# Only allow 'en' and 'fr' to be passed to app
+	lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
+	if kind not in national_map_queries.KINDS:
+		return jsonify({'Error': 'Not Found'}), 404
+	
+	# Only accept known filter values, so that each cached result is one a
+	# user can actually ask for
+	filters = national_map_queries.national_points(kind).filters(lang)
+	args = {name: request.args.get(name) or None for name in filters}
+	for name, value in args.items():
+		if value is not None and value not in filters[name]:
+			if lang == 'fr':
+				error_message = {'Erreur': 'Valeur inconnue pour {0}.'.format(name)}
+			else:
+				error_message = {'Error': 'Unknown value for {0}.'.format(name)}
+			return jsonify(error_message), 400
+	
+	bins = national_map_queries.national_map(kind, lang, args['business_type'], args['region'], args['year'])
+	return jsonify(bins=bins, filters=filters)
+
+
+@api.route('/api/v1/cache/invalidate', methods=['POST'])
+@auth.login_required
+def invalidate_cache():
+	"""Drop one named cache (?name=) or all caches in the serving process,
+	e.g. after a manual data fix that didn't change the data-load version.
+	"""
+	name = request.args.get('name', None)
+	try:
+		cache.invalidate(name)
+	except KeyError:
+		return jsonify({'Error': 'Unknown cache'}), 404
+	return jsonify({'invalidated': name or 'all'})
+
+
+def _parse_date_range():
+	"""Parse required args date_1 and date_2 of form YYYY-MM-DD."""
+	dates = tuple(parse_date(request.args.get(name, None)) for name in ('date_1', 'date_2'))
+	if None in dates:
+		raise ValueError('date_1 and date_2 are required')
+	return dates
+
+
+def _date_range_error(lang):
+	if lang == 'fr':
+		error_message = {'Erreur': 'date_1 et date_2 doivent être de forme AAAA-MM-JJ.'}
+	else:
+		error_message = {'Error': 'date_1 and date_2 must be of form YYYY-MM-DD.'}
+	return jsonify(error_message), 400
+
+
+def _calendar_filters():
+	"""Filters of the Calendar page's queries from the query string."""
+	filters = {name: request.args.get(name, None) for name in CALENDAR_TEXT_FILTERS}
+	filters.update({name: request.args.get(name, 'false') == 'true' for name in CALENDAR_FLAG_FILTERS})
+	return filters
 
 
 def _make_dict(lang, my_tup):
@@ -0,0 +1,223 @@
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from flask import copy_current_request_context, current_app, has_request_context
+from data_explorer.db import query_mysql
+
+log = logging.getLogger(__name__)
+
+# All caches created in this process, by name, for explicit invalidation
+_caches = {}
+
+# Last data-load version seen and when it was checked
+_version = None
+_version_checked_at = None
+_version_lock = threading.Lock()
+
+
+def data_version():
+	"""Identify the current data load. Taken from config DATA_LOAD_VERSION if
+	set, else from the most recent create or update time of the database's
+	tables, re-checked at most every DATA_VERSION_CHECK_INTERVAL seconds.
+	"""
+	global _version, _version_checked_at
+	if current_app.config['DATA_LOAD_VERSION']:
+		return current_app.config['DATA_LOAD_VERSION']
+	with _version_lock:
+		now = time.monotonic()
+		interval = current_app.config['DATA_VERSION_CHECK_INTERVAL']
+		if _version_checked_at is not None and now - _version_checked_at < interval:
+			return _version
+		# Claim the check so that other threads keep serving the current
+		# version meanwhile; until there is one, they check too
+		if _version is not None:
+			_version_checked_at = now
+	# Query outside the lock so that a slow information_schema doesn't
+	# stall every request thread
+	query = """
+		SELECT MAX(COALESCE(UPDATE_TIME, CREATE_TIME))
+		FROM information_schema.tables
+		WHERE table_schema = DATABASE();
+	"""
+	try:
+		results = query_mysql(query)
+	except Exception:
+		# Let the next call retry
+		with _version_lock:
+			_version_checked_at = None
+		raise
+	new_version = str(results[0][0]) if results else None
+	with _version_lock:
+		if new_version != _version:
+			log.info('Data-load version changed from %s to %s', _version, new_version)
+		_version = new_version
+		_version_checked_at = now
+	return new_version
+
+
+def expire_data_version():
+	"""Force the next call to data_version to re-check the database."""
+	global _version_checked_at
+	with _version_lock:
+		_version_checked_at = None
+
+
+class _Entry:
+	def __init__(self, value, version):
+		self.value = value
+		self.version = version
+		self.loaded_at = time.monotonic()
+
+
+class VersionedCache:
+	"""In-process cache for results that only change with a data load.
+	
+	An entry is reloaded synchronously as soon as the data-load version
+	changes, at which point entries of earlier versions are dropped. Once
+	older than ttl seconds but still current, the stale value keeps being
+	served while a background thread refreshes it. Concurrent misses for the
+	same key wait for a single load. At most max_entries keys are held, the
+	least recently used being evicted first.
+	
+	With reload_in_background, an entry of an earlier version is also kept
+	being served while a background thread reloads it, for values costly
+	enough to load that briefly serving the previous data load's is better
+	than making a request wait. Only keys not held at all are then loaded
+	synchronously.
+	"""
+	def __init__(self, name, loader, ttl=None, max_entries=None, reload_in_background=False):
+		self.name = name
+		self.loader = loader
+		# None means use config CACHE_TTL and CACHE_MAX_ENTRIES
+		self.ttl = ttl
+		self.max_entries = max_entries
+		self.reload_in_background = reload_in_background
+		# In order of least to most recent use
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+		self._key_locks = {}
+		self._refreshing = set()
+		_caches[name] = self
+	
+	
+	def get(self, *key):
+		"""Return the cached value for key, loading it via loader(*key) if needed."""
+		version = data_version()
+		entry = self._entries.get(key)
+		if entry is not None and (entry.version == version or self.reload_in_background):
+			with self._lock:
+				if key in self._entries:
+					self._entries.move_to_end(key)
+			if entry.version != version or time.monotonic() - entry.loaded_at >= self._ttl():
+				self._refresh_in_background(key, entry, version)
+			return entry.value
+		return self._load(key, version)
+	
+	
+	def invalidate(self, *key):
+		"""Drop key, or every entry if no key given."""
+		with self._lock:
+			if key:
+				self._entries.pop(key, None)
+				self._key_locks.pop(key, None)
+			else:
+				self._entries.clear()
+				self._key_locks.clear()
+	
+	
+	def _ttl(self):
+		return self.ttl if self.ttl is not None else current_app.config['CACHE_TTL']
+	
+	
+	def _max_entries(self):
+		return self.max_entries if self.max_entries is not None else current_app.config['CACHE_MAX_ENTRIES']
+	
+	
+	def _store(self, key, value, version):
+		"""Hold value for key, dropping entries of other versions and the
+		least recently used beyond max_entries. Call holding self._lock.
+		"""
+		self._entries[key] = _Entry(value, version)
+		self._entries.move_to_end(key)
+		stale = [other for (other, entry) in self._entries.items() if entry.version != version]
+		current = [other for (other, entry) in self._entries.items() if entry.version == version]
+		excess = max(len(current) - self._max_entries(), 0)
+		for other in stale + current[:excess]:
+			del self._entries[other]
+			# Threads holding the lock keep their reference to it
+			self._key_locks.pop(other, None)
+	
+	
+	def _load(self, key, version):
+		with self._lock:
+			key_lock = self._key_locks.setdefault(key, threading.Lock())
+		with key_lock:
+			# Another thread may have loaded the value while we waited
+			entry = self._entries.get(key)
+			if entry is not None and entry.version == version:
+				return entry.value
+			value = self.loader(*key)
+			with self._lock:
+				self._store(key, value, version)
+			return value
+	
+	
+	def _refresh_in_background(self, key, entry, version):
+		"""Reload key in a background thread and store it as of version,
+		unless entry has been replaced or evicted meanwhile.
+		"""
+		with self._lock:
+			if key in self._refreshing:
+				return
+			self._refreshing.add(key)
+		
+		def refresh():
+			try:
+				value = self.loader(*key)
+				with self._lock:
+					# Skip if another load replaced or evicted the entry meanwhile
+					if self._entries.get(key) is entry:
+						self._store(key, value, version)
+			except Exception:
+				log.exception('Background refresh of cache %s failed for key %s', self.name, key)
+			finally:
+				with self._lock:
+					self._refreshing.discard(key)
+		
+		# Keep the request's locale and config; the worker gets its own app
+		# context and therefore its own pooled connection
+		if has_request_context():
+			target = copy_current_request_context(refresh)
+		else:
+			app = current_app._get_current_object()
+			def target():
+				with app.app_context():
+					refresh()
+		threading.Thread(target=target, name='cache-refresh-{0}'.format(self.name), daemon=True).start()
+
+
+def cached(name, ttl=None, max_entries=None):
+	"""Decorator caching a function's results in a VersionedCache keyed
+	by its positional arguments.
+	"""
+	def decorator(func):
+		cache = VersionedCache(name, func, ttl, max_entries)
+		
+		@functools.wraps(func)
+		def wrapper(*args):
+			return cache.get(*args)
+		wrapper.cache = cache
+		return wrapper
+	return decorator
+
+
+def invalidate(name=None):
+	"""Invalidate the cache called name, or all caches, and re-check the
+	data-load version on next use. Only affects the current process.
+	"""
+	expire_data_version()
+	caches = [_caches[name]] if name else _caches.values()
+	for cache in caches:
+		cache.invalidate()
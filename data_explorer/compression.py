@@ -0,0 +1,72 @@
+import gzip
+from flask import current_app, request
+
+# Content types worth compressing
+COMPRESSIBLE_TYPES = {
+	'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+	'application/javascript', 'application/json', 'application/x-ndjson'
+}
+
+
+def brotli_available():
+	"""Check if the optional brotli dependency is installed."""
+	try:
+		import brotli
+	except ImportError:
+		return False
+	return True
+
+
+# Encodings offered, best first, resolved on first use
+_encodings = None
+
+
+def _negotiate(accept_encodings):
+	"""Pick the encoding the client prefers among those offered, or None.
+	Ties go to the better compression.
+	"""
+	global _encodings
+	if _encodings is None:
+		_encodings = ['br', 'gzip'] if brotli_available() else ['gzip']
+	best = None
+	for encoding in _encodings:
+		quality = accept_encodings[encoding]
+		if quality > 0 and (best is None or quality > best[0]):
+			best = (quality, encoding)
+	return best[1] if best else None
+
+
+def _compress(response):
+	"""Compress the body of responses of a compressible type and at least
+	COMPRESS_MIN_SIZE bytes with the encoding negotiated with the client.
+	Streamed responses, such as downloads, are left as they are.
+	"""
+	if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+			or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+		return response
+	# Whether compressed or not, caches must key on the client's encodings
+	response.vary.add('Accept-Encoding')
+	body = response.get_data()
+	if len(body) < current_app.config['COMPRESS_MIN_SIZE']:
+		return response
+	encoding = _negotiate(request.accept_encodings)
+	if encoding is None:
+		return response
+	if encoding == 'br':
+		import brotli
+		body = brotli.compress(body, quality=current_app.config['COMPRESS_BROTLI_QUALITY'])
+	else:
+		body = gzip.compress(body, compresslevel=current_app.config['COMPRESS_GZIP_LEVEL'])
+	response.set_data(body)
+	response.headers['Content-Encoding'] = encoding
+	# Strong ETags must differ per encoding; see etags.ENCODING_SUFFIXES
+	tag, weak = response.get_etag()
+	if tag and not weak:
+		response.set_etag('{0}-{1}'.format(tag, encoding))
+	return response
+
+
+def init_app(app):
+	"""In factory function, register response compression."""
+	if app.config['COMPRESS_MIN_SIZE'] >= 0:
+		app.after_request(_compress)
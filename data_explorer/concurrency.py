@@ -0,0 +1,122 @@
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from flask import copy_current_request_context, current_app, g
+from data_explorer import instrumentation
+from data_explorer.db import close_db
+
+
+class RequestMemo:
+	"""Thread-safe cache of values shared by every thread working on a
+	request. Each key has its own lock so that two threads needing the
+	same value wait for a single load while unrelated keys load in parallel.
+	"""
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._values = {}
+		self._key_locks = {}
+	
+	
+	def get(self, key, factory):
+		with self._lock:
+			if key in self._values:
+				return self._values[key]
+			key_lock = self._key_locks.setdefault(key, threading.Lock())
+		with key_lock:
+			# Another thread may have loaded the value while we waited
+			if key not in self._values:
+				value = factory()
+				with self._lock:
+					self._values[key] = value
+			return self._values[key]
+
+
+def get_memo():
+	"""Return the RequestMemo for the current request, creating if needed."""
+	if 'memo' not in g:
+		g.memo = RequestMemo()
+	return g.memo
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+	"""Return the process-wide loader pool; recreated after a fork as
+	worker threads don't survive into the child.
+	"""
+	global _executor, _executor_pid
+	with _executor_lock:
+		if _executor is None or _executor_pid != os.getpid():
+			_executor = ThreadPoolExecutor(max_workers=current_app.config['LOADER_POOL_SIZE'],
+										   thread_name_prefix='data-explorer-loader')
+			_executor_pid = os.getpid()
+		return _executor
+
+
+def _in_request_context(func, shared):
+	"""Wrap func so it runs in a copy of the current request context: the
+	worker gets its own g (and therefore its own pooled connection, returned
+	at teardown) while request cookies, and with them Babel's locale, are
+	preserved. Query stats and the memo are shared with the parent request.
+	"""
+	@copy_current_request_context
+	def wrapper():
+		for key, val in shared.items():
+			setattr(g, key, val)
+		return func()
+	return wrapper
+
+
+def run_concurrently(tasks, max_concurrency=None):
+	"""Run independent callables on the shared loader pool and return their
+	results as a dict in the order of tasks.
+	
+	Parameters
+	----------
+	
+	tasks: dict
+		Maps a name to a callable taking no arguments.
+	
+	max_concurrency: int, default LOADER_MAX_CONCURRENCY
+		Maximum number of this request's tasks running at once, so that one
+		request can't monopolise the pool.
+	
+	Error handling: once a task fails no further tasks are started; tasks
+	already running are allowed to finish, then the exception of the failed
+	task listed first in tasks is raised. The same failures therefore always
+	surface the same exception regardless of thread timing.
+	"""
+	if max_concurrency is None:
+		max_concurrency = current_app.config['LOADER_MAX_CONCURRENCY']
+	# Run inline if concurrency disabled
+	if max_concurrency <= 1 or current_app.config['LOADER_POOL_SIZE'] <= 1:
+		return {name: func() for (name, func) in tasks.items()}
+	shared = {'query_stats': instrumentation.get_stats(), 'memo': get_memo()}
+	# Hand the request's own connection back to the pool so workers can't
+	# deadlock waiting on a connection held by the thread waiting on them
+	close_db()
+	executor = _get_executor()
+	pending = list(enumerate(tasks.items()))
+	running = {}
+	results = {}
+	errors = {}
+	while pending or running:
+		while pending and len(running) < max_concurrency and not errors:
+			index, (name, func) = pending.pop(0)
+			future = executor.submit(_in_request_context(func, shared))
+			running[future] = (index, name)
+		if not running:
+			break
+		done, _ = wait(running, return_when=FIRST_COMPLETED)
+		for future in done:
+			index, name = running.pop(future)
+			try:
+				results[name] = future.result()
+			except Exception as e:
+				errors[index] = e
+	if errors:
+		raise errors[min(errors)]
+	return {name: results[name] for name in tasks}
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Config:
 	DEBUG = False
@@ -7,11 +8,64 @@ class Config:
 	BABEL_DEFAULT_LOCALE = 'en'
 	# Options for flask.jsonify
 	JSON_AS_ASCII = False
-	JSONIFY_PRETTYPRINT_REGULAR = True
 	JSON_SORT_KEYS = False
+	# Options for serialization.jsonify and the json_filter: responses are compact
+	# unless pretty-printing is enabled or in debug mode. JSON_BACKEND is one of
+	# 'json', 'orjson', or 'auto' for orjson if installed
+	JSONIFY_PRETTYPRINT_REGULAR = os.environ.get('JSONIFY_PRETTYPRINT_REGULAR', 'false').lower() == 'true'
+	JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+	# Connection pool; size should cover the WSGI threads plus LOADER_POOL_SIZE per process
+	DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 25))
+	# Seconds before a connection is closed and replaced; keep below MySQL's wait_timeout
+	DB_POOL_MAX_LIFETIME = int(os.environ.get('DB_POOL_MAX_LIFETIME', 3600))
+	# Seconds to wait for a free connection before failing the request
+	DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+	# Query instrumentation: statements slower than this are written to the
+	# 'data_explorer.slow_queries' log
+	SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+	# Report DB time per request in a Server-Timing header, listing the N slowest query classes
+	SERVER_TIMING = os.environ.get('SERVER_TIMING', 'true').lower() == 'true'
+	SERVER_TIMING_TOP_N = int(os.environ.get('SERVER_TIMING_TOP_N', 5))
+	# Threads per process loading independent parts of a page concurrently,
+	# and the most any single request may use at once; 1 disables
+	LOADER_POOL_SIZE = int(os.environ.get('LOADER_POOL_SIZE', 8))
+	LOADER_MAX_CONCURRENCY = int(os.environ.get('LOADER_MAX_CONCURRENCY', 4))
+	# Caches of data that only changes with the nightly load: entries are reloaded
+	# when the data-load version changes and refreshed in the background after
+	# CACHE_TTL seconds. The version is read from the DB every
+	# DATA_VERSION_CHECK_INTERVAL seconds unless pinned with DATA_LOAD_VERSION.
+	# Each cache holds at most CACHE_MAX_ENTRIES keys e.g. courses, evicting
+	# the least recently used
+	CACHE_TTL = int(os.environ.get('CACHE_TTL', 21600))
+	CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 256))
+	DATA_VERSION_CHECK_INTERVAL = int(os.environ.get('DATA_VERSION_CHECK_INTERVAL', 300))
+	DATA_LOAD_VERSION = os.environ.get('DATA_LOAD_VERSION')
+	# Query results with more rows than this are processed with pandas, smaller
+	# ones in plain Python
+	PANDAS_ROW_THRESHOLD = int(os.environ.get('PANDAS_ROW_THRESHOLD', 1000))
+	# Courses with more registrations than this in a year are aggregated by
+	# MySQL rather than fetched for the learner dashboards
+	LEARNER_FETCH_THRESHOLD = int(os.environ.get('LEARNER_FETCH_THRESHOLD', 1000))
+	# Lists of offerings longer than this are coloured with NumPy, shorter
+	# ones row by row
+	VECTORIZE_ROW_THRESHOLD = int(os.environ.get('VECTORIZE_ROW_THRESHOLD', 500))
+	# Compress responses of at least COMPRESS_MIN_SIZE bytes with brotli, if
+	# installed and accepted, else gzip; a negative size disables compression
+	COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+	COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+	COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+	# Width in degrees of the cells into which the national map bins locations
+	NATIONAL_MAP_BIN_DEGREES = float(os.environ.get('NATIONAL_MAP_BIN_DEGREES', 0.5))
+	# Rows fetched from MySQL and written to a download's workbook at a time
+	EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 5000))
+	# Background exports: statuses and finished files are kept in EXPORT_DIR, which
+	# every process must share, and run on EXPORT_WORKERS threads per process. A job
+	# without progress for EXPORT_JOB_TIMEOUT seconds is assumed dead and re-run
+	EXPORT_DIR = os.environ.get('EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'data-explorer-exports'))
+	EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+	EXPORT_JOB_TIMEOUT = int(os.environ.get('EXPORT_JOB_TIMEOUT', 900))
 	# Load strings from environ vars to avoid storing in plaintext
 	BASIC_AUTH_USERNAME = os.environ.get('BASIC_AUTH_USERNAME')
 	BASIC_AUTH_PASSWORD = os.environ.get('BASIC_AUTH_PASSWORD')
 	SECRET_KEY = os.environ.get('SECRET_KEY')
 	GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY')
-	REGISTHOR_API_KEY = os.environ.get('REGISTHOR_API_KEY')
@@ -0,0 +1,155 @@
+import math
+from bisect import bisect_left, bisect_right
+
+# Zoom levels precomputed; above MAX_ZOOM cities are returned unclustered
+MIN_ZOOM = 0
+MAX_ZOOM = 14
+# Width in pixels of a tile in Web Mercator and of a cluster's grid cell
+TILE_SIZE = 256
+CELL_SIZE = 64
+# Latitudes beyond which Web Mercator is undefined
+MAX_LATITUDE = 85.05112878
+
+
+def _mercator(lat, lng):
+	"""Project to Web Mercator coordinates x, y in [0, 1), y pointing south."""
+	lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+	sin_lat = math.sin(math.radians(lat))
+	x = (lng + 180.0) / 360.0
+	y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+	return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+
+class _Cluster:
+	"""Cities merged into one marker. Named after its largest city and
+	placed at its members' centroid weighted by count.
+	"""
+	__slots__ = ('name', 'top_count', 'count', 'size', 'lat_sum', 'lng_sum', 'x', 'y')
+	
+	def __init__(self, name, count, lat, lng):
+		self.name = name
+		self.top_count = count
+		self.count = count
+		self.size = 1
+		self.lat_sum = lat * count
+		self.lng_sum = lng * count
+		self.x, self.y = _mercator(lat, lng)
+	
+	
+	def merge(self, other):
+		# Keep the name of the larger city; ties go to the one already held
+		if other.top_count > self.top_count:
+			self.name, self.top_count = other.name, other.top_count
+		self.count += other.count
+		self.size += other.size
+		self.lat_sum += other.lat_sum
+		self.lng_sum += other.lng_sum
+	
+	
+	def copy(self):
+		clone = _Cluster.__new__(_Cluster)
+		for attr in self.__slots__:
+			setattr(clone, attr, getattr(self, attr))
+		return clone
+	
+	
+	def position(self):
+		"""Latitude and longitude of the cluster's centroid."""
+		if self.count:
+			return self.lat_sum / self.count, self.lng_sum / self.count
+		return self._position_of_empty()
+	
+	
+	def place(self):
+		"""Move the cluster's projected coordinates to its centroid."""
+		self.x, self.y = _mercator(*self.position())
+	
+	
+	def as_list(self):
+		"""Form ['city_name', count, latitude, longitude, number_of_cities]."""
+		lat, lng = self.position()
+		return [self.name, self.count, round(lat, 5), round(lng, 5), self.size]
+	
+	
+	def _position_of_empty(self):
+		# Clusters of cities with a count of 0 can't be weighted; use the grid point
+		lng = self.x * 360.0 - 180.0
+		lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * self.y))))
+		return lat, lng
+
+
+class ClusterPyramid:
+	"""Markers for a list of cities clustered on a grid at every zoom level
+	from MIN_ZOOM to MAX_ZOOM, so that a map at any zoom gets a few dozen
+	markers rather than every city.
+	
+	At zoom z the world is TILE_SIZE * 2**z pixels wide and cities are
+	grouped by the CELL_SIZE-pixel cell of the Web Mercator grid they fall
+	in. As each cell holds exactly four cells of the level below, levels
+	are built bottom-up by merging the clusters of the level below, so the
+	whole pyramid costs O(cities * levels). Each level's clusters are
+	sorted by x so that bounding-box queries bisect rather than scan.
+	"""
+	def __init__(self, cities):
+		"""cities: list of lists ['city_name', count, latitude, longitude]."""
+		points = [_Cluster(city[0], int(city[1]), float(city[2]), float(city[3])) for city in cities]
+		self._levels = {MAX_ZOOM + 1: self._sorted(points)}
+		# Cell of each cluster at the current level, built from the finest grid
+		cells_per_side = TILE_SIZE * 2 ** MAX_ZOOM // CELL_SIZE
+		clusters = {}
+		for point in points:
+			key = (int(point.x * cells_per_side), int(point.y * cells_per_side))
+			if key in clusters:
+				clusters[key].merge(point)
+			else:
+				clusters[key] = point.copy()
+		for zoom in range(MAX_ZOOM, MIN_ZOOM - 1, -1):
+			self._levels[zoom] = self._sorted(list(clusters.values()))
+			parents = {}
+			for (cell_x, cell_y), cluster in clusters.items():
+				key = (cell_x >> 1, cell_y >> 1)
+				if key in parents:
+					parents[key] = parents[key].copy()
+					parents[key].merge(cluster)
+				else:
+					parents[key] = cluster
+			clusters = parents
+	
+	
+	@staticmethod
+	def _sorted(clusters):
+		"""Tuple (xs, clusters) of clusters placed at their centroids and
+		sorted by x.
+		"""
+		for cluster in clusters:
+			if cluster.size > 1:
+				cluster.place()
+		clusters = sorted(clusters, key=lambda cluster: cluster.x)
+		return [cluster.x for cluster in clusters], clusters
+	
+	
+	def clusters(self, zoom, bbox=None):
+		"""Markers for a map at zoom within bbox, a tuple (west, south,
+		east, north) in degrees, largest first. bbox may cross the
+		antimeridian i.e. west > east; None means the whole world.
+		"""
+		zoom = int(math.floor(zoom))
+		level = MAX_ZOOM + 1 if zoom > MAX_ZOOM else max(zoom, MIN_ZOOM)
+		xs, clusters = self._levels[level]
+		if bbox is None:
+			selected = clusters
+		else:
+			west, south, east, north = bbox
+			x_west, y_north = _mercator(north, west)
+			x_east, y_south = _mercator(south, east)
+			if west <= east:
+				ranges = [(x_west, x_east)]
+			else:
+				ranges = [(x_west, 1.0), (0.0, x_east)]
+			selected = []
+			for x_min, x_max in ranges:
+				for cluster in clusters[bisect_left(xs, x_min):bisect_right(xs, x_max)]:
+					if y_north <= cluster.y <= y_south:
+						selected.append(cluster)
+		selected = sorted(selected, key=lambda cluster: cluster.count, reverse=True)
+		return [cluster.as_list() for cluster in selected]
@@ -1,31 +1,37 @@
-import pandas as pd
 from flask_babel import gettext
+from data_explorer.cache import cached
 from data_explorer.db import query_mysql
-from data_explorer.course_routes.forms import _clean_title
+from data_explorer.course_routes.registry import _clean_title
+from data_explorer.course_routes.utils import use_pandas
+
+# Business lines and providers shown as awaiting mapping
+UNMAPPED = ['', None, 'None']
 
 
 class CourseList:
 	"""Data for the Browse page, purpose of which is to allow users to 
 	browse by Business Line and Provider.
 	"""
+	columns = ['provider', 'business_line', 'course_code', 'course_title']
+	
 	def __init__(self, lang):
 		self.lang = lang
-		self.data = None
-		self.business_lines = None
-		self.providers = None
+		# Raw rows as tuples in the order of columns
+		self.rows = None
+		# Nested dicts of form {business_line: {provider: [[course_code, course_title], ...]}}
+		self.nested = None
 	
 	
 	def load(self):
 		"""Run query and process all raw data."""
 		self._load_courses()
-		self._load_business_lines()
-		self._load_providers()
+		self._load_nested()
 		# Return self to allow method chaining
 		return self
 	
 	
 	def _load_courses(self):
-		"""Query the DB and store results in DataFrame."""
+		"""Query the DB and store results."""
 		# Get course codes from LSR to ensure course has usage and will
 		# therefore have an entry in the Data Explorer i.e. no dead links
 		query = """
@@ -44,53 +50,52 @@ class CourseList:
 			ON b.course_code = c.course_code
 			GROUP BY b.course_code;
 		""".format(self.lang)
-		results = query_mysql(query)
-		results = pd.DataFrame(results, columns=['provider', 'business_line', 'course_code', 'course_title'])
-		self.data = results
-	
-	
-	def _load_business_lines(self):
-		"""Get list of unique business lines."""
-		business_lines = self.data.loc[:, 'business_line']
-		business_lines.replace(['', None, 'None'], gettext('<awaiting mapping>'), inplace=True)
-		business_lines = business_lines.unique()
-		# .unique() returns an ndarray
-		business_lines.sort()
-		self.business_lines = business_lines
-	
-	
-	def _load_providers(self):
-		"""Get list of unique providers."""
-		providers = self.data.loc[:, 'provider']
-		providers.replace(['', None, 'None'], gettext('<awaiting mapping>'), inplace=True)
-		providers = providers.unique()
-		# .unique() returns an ndarray
-		providers.sort()
-		self.providers = providers
+		self.rows = query_mysql(query)
 	
 	
-	def _get_courses(self, business_line, provider):
-		"""For a given business line and provider, output list of
-		associated course codes and course titles.
+	def _load_nested(self):
+		"""Nest courses by business line, then provider, in a single pass
+		over the rows sorted by course. Keys and each provider's courses are
+		sorted. Uses pandas above PANDAS_ROW_THRESHOLD rows.
 		"""
-		business_line_bool = self.data['business_line'] == business_line
-		provider_bool = self.data['provider'] == provider
-		courses = self.data.loc[business_line_bool & provider_bool, ['course_code', 'course_title']].values.tolist()
-		courses = sorted(courses)
-		# Remove course codes from titles
-		results_processed = [[course[0], _clean_title(course[1])] for course in courses]
-		return results_processed
+		if use_pandas(self.rows):
+			self._load_nested_frame()
+			return
+		awaiting_mapping = gettext('<awaiting mapping>')
+		results = {}
+		# Missing codes and titles sort last, as in pandas
+		for provider, business_line, course_code, course_title in sorted(self.rows, key=_course_sort_key):
+			business_line = awaiting_mapping if business_line in UNMAPPED else business_line
+			provider = awaiting_mapping if provider in UNMAPPED else provider
+			# Remove course codes from titles; each course appears once
+			results.setdefault(business_line, {}).setdefault(provider, []).append([course_code, _clean_title(course_title)])
+		self.nested = {business_line: {provider: results[business_line][provider] for provider in sorted(results[business_line])}
+					   for business_line in sorted(results)}
 	
 	
-	def _get_nested_dicts(self):
-		"""Create a nested dictionary based on self.business_lines and self.providers."""
+	def _load_nested_frame(self):
+		"""Same as _load_nested with pandas."""
+		import pandas as pd
+		data = pd.DataFrame(self.rows, columns=self.columns)
+		for field_name in ['business_line', 'provider']:
+			data[field_name] = data[field_name].replace(UNMAPPED, gettext('<awaiting mapping>'))
+		courses = data.sort_values(['course_code', 'course_title'])
 		results = {}
-		for business_line in self.business_lines:
-			business_line_courses = {}
-			for provider in self.providers:
-				courses = self._get_courses(business_line, provider)
-				if courses:
-					business_line_courses[provider] = courses
-			if business_line_courses:
-				results[business_line] = business_line_courses
-		return results
+		for (business_line, provider), group in courses.groupby(['business_line', 'provider'], sort=True):
+			# Remove course codes from titles; each course appears once
+			results.setdefault(business_line, {})[provider] = [[course_code, _clean_title(course_title)]
+															   for (course_code, course_title) in zip(group['course_code'], group['course_title'])]
+		self.nested = results
+
+
+def _course_sort_key(row):
+	course_code, course_title = row[2], row[3]
+	return (course_code is None, course_code or '', course_title is None, course_title or '')
+
+
+@cached('browse_courses')
+def nested_courses(lang):
+	"""Browse page's courses by business line and provider; cached per
+	lang until the next data load.
+	"""
+	return CourseList(lang).load().nested
@@ -0,0 +1,258 @@
+import datetime
+from bisect import bisect_left
+from collections import Counter
+from data_explorer.cache import VersionedCache
+from data_explorer.db import query_mysql
+from data_explorer.course_routes.queries.schedule_queries import assign_background_colors
+
+# Every offering with dates, with its course's business line
+OFFERINGS_QUERY = """
+	SELECT o.offering_id, o.course_code, o.course_title_en, o.course_title_fr, o.instructor_names,
+		o.confirmed_count, o.cancelled_count, o.waitlisted_count, o.no_show_count, o.business_type,
+		o.event_description, o.start_date, o.end_date, o.client, o.offering_status, o.offering_language,
+		o.offering_region_en, o.offering_region_fr, o.offering_province_en, o.offering_province_fr,
+		o.offering_city_en, o.offering_city_fr, o.offering_lat, o.offering_lng,
+		p.business_line_en, p.business_line_fr
+	FROM offerings AS o
+	LEFT OUTER JOIN product_info AS p
+	ON o.course_code = p.course_code
+	WHERE o.start_date IS NOT NULL AND o.end_date IS NOT NULL;
+"""
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+class OfferingIndex:
+	"""Every offering held in memory with an interval index over its dates,
+	so that the Calendar page's offerings overlapping a date range are found
+	by binary search rather than by querying the DB.
+	
+	The index is two sorted lists of tuples (start_date, offering_id) and
+	(end_date, offering_id). An offering overlaps [date_1, date_2] if it
+	starts on or before date_2 and ends on or after date_1; as no offering
+	runs longer than max_duration, those starting in [date_1 - max_duration,
+	date_2] or ending in [date_1, date_2 + max_duration] are candidates, and
+	whichever slice is shorter is scanned.
+	"""
+	def __init__(self):
+		# Dict mapping offering_id to its row as a dict
+		self.offerings = {}
+		self.starts = []
+		self.ends = []
+		self.max_duration = datetime.timedelta(0)
+		# Dict mapping lang to the CityCounts of all offerings
+		self.city_counts = {}
+	
+	
+	def load(self):
+		"""Run query and index results."""
+		rows = query_mysql(OFFERINGS_QUERY, dict_=True)
+		self.offerings = {row['offering_id']: row for row in rows}
+		self.starts = sorted((row['start_date'], offering_id) for (offering_id, row) in self.offerings.items())
+		self.ends = sorted((row['end_date'], offering_id) for (offering_id, row) in self.offerings.items())
+		durations = (row['end_date'] - row['start_date'] for row in self.offerings.values())
+		self.max_duration = max(durations, default=datetime.timedelta(0))
+		self.city_counts = {lang: CityCounts(lang).load(self.offerings.values()) for lang in ('en', 'fr')}
+		# Return self to allow method chaining
+		return self
+	
+	
+	def overlapping(self, date_1, date_2):
+		"""Rows of offerings running on at least one day from date_1 to
+		date_2 inclusive, in order of start date.
+		"""
+		if date_2 < date_1 or not self.starts:
+			return []
+		# Slice of offerings starting in [date_1 - max_duration, date_2]
+		start_lo = bisect_left(self.starts, (date_1 - self.max_duration,))
+		start_hi = bisect_left(self.starts, (date_2 + ONE_DAY,))
+		# Slice of offerings ending in [date_1, date_2 + max_duration]
+		end_lo = bisect_left(self.ends, (date_1,))
+		end_hi = bisect_left(self.ends, (date_2 + self.max_duration + ONE_DAY,))
+		if start_hi - start_lo <= end_hi - end_lo:
+			rows = [self.offerings[offering_id] for (_, offering_id) in self.starts[start_lo:start_hi]]
+			return [row for row in rows if row['end_date'] >= date_1]
+		rows = [self.offerings[offering_id] for (_, offering_id) in self.ends[end_lo:end_hi]]
+		rows = [row for row in rows if row['start_date'] <= date_2]
+		return sorted(rows, key=lambda row: (row['start_date'], row['offering_id']))
+	
+	
+	def starting(self, date_1, date_2):
+		"""Rows of offerings starting from date_1 to date_2 inclusive."""
+		lo = bisect_left(self.starts, (date_1,))
+		hi = bisect_left(self.starts, (date_2 + ONE_DAY,))
+		return [self.offerings[offering_id] for (_, offering_id) in self.starts[lo:hi]]
+
+
+class CityCounts:
+	"""Cumulative number of offerings per city by start date, so that the
+	number of offerings starting in any date range is, for every city at
+	once, the difference of two columns: O(cities) per query once the range
+	is located by binary search, rather than a scan of the offerings.
+	
+	The day axis holds only the distinct start dates, sorted, so that memory
+	is cities * distinct start dates however far apart the dates are.
+	Column j of cumulative holds each city's number of offerings starting
+	before days[j], and column len(days) its total. Cancelled offerings are
+	also counted separately so that they can be excluded. Offerings without
+	a city are not counted.
+	"""
+	def __init__(self, lang):
+		self.lang = lang
+		# Lists of form ['city_name', latitude, longitude]
+		self.cities = []
+		# Distinct start dates as ordinals, sorted
+		self.days = None
+		# Arrays of shape (len(cities), len(days) + 1)
+		self.cumulative = None
+		self.cumulative_cancelled = None
+	
+	
+	def load(self, rows):
+		"""Count start dates of rows, dicts of offerings."""
+		import numpy as np
+		field_name = 'offering_city_{0}'.format(self.lang)
+		rows = [row for row in rows if row[field_name] is not None]
+		city_index = {}
+		for row in rows:
+			city = row[field_name]
+			if city not in city_index:
+				city_index[city] = len(self.cities)
+				self.cities.append([city, None, None])
+			# Take each city's first coordinates
+			entry = self.cities[city_index[city]]
+			if entry[1] is None and row['offering_lat'] is not None and row['offering_lng'] is not None:
+				entry[1], entry[2] = float(row['offering_lat']), float(row['offering_lng'])
+		ordinals = np.array([row['start_date'].toordinal() for row in rows], dtype=np.int64)
+		# Position of each offering's start date on the compressed day axis
+		self.days, day_index = np.unique(ordinals, return_inverse=True)
+		cities = np.array([city_index[row[field_name]] for row in rows], dtype=np.int64)
+		cancelled = np.array([row['offering_status'] == 'Cancelled - Normal' for row in rows], dtype=bool)
+		self.cumulative = self._cumulate(cities, day_index)
+		self.cumulative_cancelled = self._cumulate(cities[cancelled], day_index[cancelled])
+		# Return self to allow method chaining
+		return self
+	
+	
+	def _cumulate(self, cities, day_index):
+		"""Cumulative counts of offerings by city and position of start date."""
+		import numpy as np
+		counts = np.zeros((len(self.cities), len(self.days) + 1), dtype=np.int32)
+		# Offerings counted in the column after their start date's so that
+		# column 0 is all zeros after the cumulative sum
+		np.add.at(counts, (cities, day_index + 1), 1)
+		return np.cumsum(counts, axis=1, dtype=np.int32)
+	
+	
+	def between(self, date_1, date_2, exclude_cancelled=False):
+		"""Offerings per city starting from date_1 to date_2 inclusive, as
+		dicts with keys offering_city, offering_lat, offering_lng, and count,
+		largest first. Cities without offerings in the range are omitted.
+		"""
+		import numpy as np
+		if date_2 < date_1 or not self.cities:
+			return []
+		# Columns counting offerings starting before date_1, and up to date_2
+		lo = int(np.searchsorted(self.days, date_1.toordinal(), side='left'))
+		hi = int(np.searchsorted(self.days, date_2.toordinal(), side='right'))
+		counts = self.cumulative[:, hi] - self.cumulative[:, lo]
+		if exclude_cancelled:
+			counts -= self.cumulative_cancelled[:, hi] - self.cumulative_cancelled[:, lo]
+		results = [(self.cities[i], count) for (i, count) in enumerate(counts.tolist()) if count]
+		return _city_dicts(results)
+
+
+def _city_dicts(results):
+	"""Dicts for tuples (['city_name', latitude, longitude], count), largest
+	first then by name.
+	"""
+	results = sorted(results, key=lambda result: (-result[1], result[0][0] or ''))
+	return [{'offering_city': city, 'offering_lat': lat, 'offering_lng': lng, 'count': count}
+			for ([city, lat, lng], count) in results]
+
+
+# Rebuilt in the background whenever the data-load version changes, the
+# previous load's index being served meanwhile so that no request waits
+# for a read and sort of the whole table
+_offering_index = VersionedCache('offering_index', lambda: OfferingIndex().load(), reload_in_background=True)
+
+
+def get_offering_index():
+	"""Return the process's OfferingIndex, loading it if needed."""
+	return _offering_index.get()
+
+
+def offerings(lang, date_1, date_2, today, **filters):
+	"""Data for the Calendar page's table: offerings overlapping date_1 to
+	date_2 that match every filter given (see _filter), as dicts with
+	fields in lang and the same background colours relative to today as
+	the Schedule tab.
+	"""
+	rows = get_offering_index().overlapping(date_1, date_2)
+	rows = _filter(rows, lang, **filters)
+	results = [_calendar_item(lang, row) for row in rows]
+	return assign_background_colors(results, today, 'background_color')
+
+
+def counts_by_city(lang, date_1, date_2, **filters):
+	"""Data for the Calendar page's map: offerings starting from date_1 to
+	date_2 per city, with the city's coordinates. Served from CityCounts
+	unless filtering on more than exclude_cancelled, in which case the
+	offerings starting in the range are filtered and counted.
+	"""
+	index = get_offering_index()
+	exclude_cancelled = filters.pop('exclude_cancelled', False)
+	if not any(filters.values()):
+		return index.city_counts[lang].between(date_1, date_2, exclude_cancelled)
+	rows = _filter(index.starting(date_1, date_2), lang, exclude_cancelled=exclude_cancelled, **filters)
+	field_name = 'offering_city_{0}'.format(lang)
+	counts = Counter(row[field_name] for row in rows if row[field_name] is not None)
+	cities = {city[0]: city for city in index.city_counts[lang].cities}
+	return _city_dicts([(cities[city], count) for (city, count) in counts.items()])
+
+
+def _filter(rows, lang, region=None, status=None, language=None, course_code=None, instructor_name=None,
+			business_line=None, exclude_cancelled=False, clients_only=False):
+	"""Keep rows matching every filter given; text fields are in lang."""
+	filters = [
+		('offering_region_{0}'.format(lang), region),
+		('offering_status', status),
+		('offering_language', language),
+		('business_line_{0}'.format(lang), business_line)
+	]
+	for field_name, value in filters:
+		if value:
+			rows = [row for row in rows if row[field_name] == value]
+	if course_code:
+		rows = [row for row in rows if (row['course_code'] or '').upper() == course_code.upper()]
+	if instructor_name:
+		rows = [row for row in rows if instructor_name.lower() in (row['instructor_names'] or '').lower()]
+	if exclude_cancelled:
+		rows = [row for row in rows if row['offering_status'] != 'Cancelled - Normal']
+	if clients_only:
+		rows = [row for row in rows if row['client']]
+	return rows
+
+
+def _calendar_item(lang, row):
+	return {
+		'offering_id': row['offering_id'],
+		'course_code': row['course_code'],
+		'course_title': row['course_title_{0}'.format(lang)],
+		'business_type': row['business_type'],
+		'business_line': row['business_line_{0}'.format(lang)],
+		'instructor_names': row['instructor_names'],
+		'start_date': row['start_date'],
+		'end_date': row['end_date'],
+		'offering_status': row['offering_status'],
+		'offering_language': row['offering_language'],
+		'offering_region': row['offering_region_{0}'.format(lang)],
+		'offering_province': row['offering_province_{0}'.format(lang)],
+		'offering_city': row['offering_city_{0}'.format(lang)],
+		'confirmed_count': row['confirmed_count'],
+		'cancelled_count': row['cancelled_count'],
+		'waitlisted_count': row['waitlisted_count'],
+		'no_show_count': row['no_show_count'],
+		'event_description': row['event_description'],
+		'client': row['client']
+	}
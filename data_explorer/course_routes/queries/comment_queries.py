@@ -1,22 +1,39 @@
-import pandas as pd
+import base64
+import json
 from flask_babel import gettext
 from data_explorer.db import query_mysql
+from data_explorer.course_routes.utils import use_pandas
+
+
+# Columns by which pages of comments are sorted, descending; survey_id is
+# unique so that every comment has its own place
+SORT_KEY = ['fiscal_year', 'quarter', 'stars', 'survey_id']
 
 
 class Comments:
-	"""Fetch comments for the API."""
-	def __init__(self, lang, course_code, short_question, fiscal_year, stars, limit, offset):
+	"""Fetch a page of comments for the API.
+	
+	Pages are ordered by the columns of SORT_KEY, all descending, and
+	fetched by seeking past the last row of the previous page rather than
+	with an offset, so that every page costs the same however deep it is.
+	Comments without a fiscal year, quarter, or stars sort after those with
+	one, as MySQL sorts NULLs last when descending.
+	"""
+	def __init__(self, lang, course_code, short_question, fiscal_year, stars, limit, cursor=None):
 		self.lang = lang
 		self.course_code = course_code
 		self.short_question = short_question
 		self.fiscal_year = fiscal_year
 		self.stars = stars
 		self.limit = limit
-		self.offset = offset
+		# Opaque token from a previous page's next_cursor; None for the first page
+		self.cursor = cursor
 		# Raw data returned by query
 		self.raw = None
 		# Processed data
 		self.processed = None
+		# Token for the page after this one; None if this is the last page
+		self.next_cursor = None
 	
 	
 	def load(self):
@@ -28,12 +45,14 @@ class Comments:
 	
 	
 	def _load_raw(self):
-		"""Query the DB and extract all comments of a given type for
-		self.course_code.
+		"""Query the DB and extract a page of comments of a given type for
+		self.course_code as a list of tuples, or False if there are none.
+		Raises ValueError if self.cursor is invalid.
 		"""
 		field_name = 'offering_city_{0}'.format(self.lang)
+		seek, seek_args = self._seek_clause()
 		query = """
-			SELECT text_answer, {0}, fiscal_year, quarter, stars, nanos
+			SELECT text_answer, {0}, fiscal_year, quarter, stars, nanos, survey_id
 			FROM comments
 			WHERE
 				course_code = %s
@@ -43,39 +62,71 @@ class Comments:
 				(fiscal_year = %s OR %s = '')
 				AND
 				(stars = %s OR %s = '')
-			ORDER BY 4 DESC, 5 DESC
-			LIMIT %s OFFSET %s;
-		""".format(field_name)
+				{1}
+			ORDER BY fiscal_year DESC, quarter DESC, stars DESC, survey_id DESC
+			LIMIT %s;
+		""".format(field_name, seek)
+		# Fetch one extra row to know if there's a next page
 		results = query_mysql(query, (self.course_code,
 									  self.short_question,
 									  self.fiscal_year, self.fiscal_year,
 									  self.stars, self.stars,
-									  int(self.limit), int(self.offset)))
-		results = pd.DataFrame(results, columns=['text_answer', 'offering_city',
-												 'fiscal_year', 'quarter', 'stars', 'nanos'])
-		# Account for learners who didn't submit stars with their comments
-		results['stars'].fillna(0, inplace=True)
+									  *seek_args,
+									  self.limit + 1))
+		if len(results) > self.limit:
+			results = results[:self.limit]
+			last = results[-1]
+			self.next_cursor = encode_cursor(last[2], last[3], last[4], last[6])
 		# Return False if course has received no feedback
-		return False if results.empty else results
+		return results if results else False
+	
+	
+	def _seek_clause(self):
+		"""SQL restricting results to rows after self.cursor, and its args."""
+		if self.cursor is None:
+			return '', ()
+		# Spelled out rather than as a row comparison so that MySQL can use
+		# an index and so that NULLs keep their place after other values:
+		# a row comes after the cursor if it ties on the first columns and
+		# comes after it on the next
+		terms = []
+		args = []
+		ties = []
+		tie_args = []
+		for column, value in zip(SORT_KEY, decode_cursor(self.cursor)):
+			# Nothing comes after NULL within ties on the previous columns
+			if value is None:
+				ties.append('{0} IS NULL'.format(column))
+				continue
+			after = '{0} < %s'.format(column) if column == 'survey_id' else '({0} < %s OR {0} IS NULL)'.format(column)
+			terms.append('({0})'.format(' AND '.join(ties + [after])))
+			args.extend(tie_args + [value])
+			ties.append('{0} = %s'.format(column))
+			tie_args.append(value)
+		clause = """
+				AND
+				({0})
+		""".format(' OR '.join(terms))
+		return clause, tuple(args)
 	
 	
 	def _process_raw(self):
-		""" Parse raw data with Pandas and process into form required for API.
-		Return False if course has received no comments.
+		"""Process raw data into form required for API, with pandas if the
+		page has more than PANDAS_ROW_THRESHOLD rows. Return False if course
+		has received no comments.
 		"""
-		# Explicitely checking 'if df is False' rather than 'if not df' as
-		# DataFrames do not have a truth value
 		if self.raw is False:
 			return False
+		rows = self._fill_stars_frame() if use_pandas(self.raw) else self._fill_stars()
 		results_processed = []
 		# Unpack tuple as some fields require customization
-		for row in self.raw.itertuples(index=False):
+		for row in rows:
 			text_answer = row[0]
 			# Account for English vs French title formatting
 			offering_city = self._format_title(row[1])
 			fiscal_year = row[2]
 			# Account for e.g. 'Q2' being 'T2' in FR
-			quarter = row[3].replace('Q', 'T') if self.lang == 'fr' else row[3]
+			quarter = row[3].replace('Q', 'T') if self.lang == 'fr' and row[3] is not None else row[3]
 			stars = int(row[4])
 			nanos = row[5]
 			# Reassemble and append
@@ -84,6 +135,20 @@ class Comments:
 		return results_processed
 	
 	
+	def _fill_stars(self):
+		"""Account for learners who didn't submit stars with their comments."""
+		return [row[:4] + (0 if row[4] is None else row[4],) + row[5:] for row in self.raw]
+	
+	
+	def _fill_stars_frame(self):
+		"""Same as _fill_stars with pandas."""
+		import pandas as pd
+		results = pd.DataFrame(self.raw, columns=['text_answer', 'offering_city', 'fiscal_year',
+												  'quarter', 'stars', 'nanos', 'survey_id'])
+		results['stars'] = results['stars'].fillna(0)
+		return results.itertuples(index=False)
+	
+	
 	def _format_title(self, my_string):
 		"""Correct English and French formatting edge cases."""
 		if self.lang == 'fr':
@@ -96,6 +161,36 @@ class Comments:
 			return s
 
 
+def encode_cursor(fiscal_year, quarter, stars, survey_id):
+	"""Pack the sort key of a page's last comment into an opaque token."""
+	fiscal_year = fiscal_year if fiscal_year is None or isinstance(fiscal_year, (int, str)) else str(fiscal_year)
+	stars = None if stars is None else int(stars)
+	survey_id = survey_id if isinstance(survey_id, (int, str)) else str(survey_id)
+	payload = json.dumps([fiscal_year, quarter, stars, survey_id], separators=(',', ':'))
+	return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+	"""Unpack a token from encode_cursor into (fiscal_year, quarter, stars,
+	survey_id), of which all but survey_id may be None. Raises ValueError
+	if the token is malformed.
+	"""
+	try:
+		padded = cursor + '=' * (-len(cursor) % 4)
+		fiscal_year, quarter, stars, survey_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+	except (TypeError, ValueError, UnicodeError) as e:
+		raise ValueError('Invalid cursor.') from e
+	valid = (
+		(fiscal_year is None or isinstance(fiscal_year, (int, str)))
+		and (quarter is None or isinstance(quarter, str))
+		and (stars is None or isinstance(stars, int))
+		and isinstance(survey_id, (int, str))
+	)
+	if not valid:
+		raise ValueError('Invalid cursor.')
+	return fiscal_year, quarter, stars, survey_id
+
+
 class CommentCounts:
 	"""Fetch number of comments by star for a given course code, question,
 	and fiscal year for the API.
@@ -145,6 +240,17 @@ class CommentCounts:
 
 class Categorical:
 	"""Data for the Categorical section of the Comments tab."""
+	# Question of each chart, by attribute
+	questions = {
+		'expectations': '12. Expectations Met',
+		'recommend': '13. Recommend learning Activity',
+		'gccampus': '14. GCCampus Usage',
+		'videos': '15. Videos',
+		'blogs': '16. Blogs',
+		'forums': '17. Forums',
+		'job_aids': '18. Job aids'
+	}
+	
 	def __init__(self, lang, course_code):
 		self.lang = lang
 		self.course_code = course_code
@@ -163,14 +269,10 @@ class Categorical:
 	def load(self):
 		"""Run query and process raw data."""
 		self.categorical_data = self._load_all_categorical()
-		# Parse with Pandas and process into form required by Highcharts
-		self.expectations = self._load_categorical('12. Expectations Met')
-		self.recommend = self._load_categorical('13. Recommend learning Activity')
-		self.gccampus = self._load_categorical('14. GCCampus Usage')
-		self.videos = self._load_categorical('15. Videos')
-		self.blogs = self._load_categorical('16. Blogs')
-		self.forums = self._load_categorical('17. Forums')
-		self.job_aids = self._load_categorical('18. Job aids')
+		# Process into form required by Highcharts
+		answers = self._group_answers()
+		for attr, question in self.questions.items():
+			setattr(self, attr, self._load_categorical(answers, question))
 		# Return self to allow method chaining
 		return self
 	
@@ -184,34 +286,44 @@ class Categorical:
 			WHERE
 				course_code = %s
 				AND
-				original_question IN (
-					'12. Expectations Met', '13. Recommend learning Activity', '14. GCCampus Usage',
-					'15. Videos', '16. Blogs', '17. Forums', '18. Job aids'
-				)
+				original_question IN ({1})
 			GROUP BY 1, 2
 			ORDER BY 1 ASC;
-		""".format(field_name)
-		results = query_mysql(query, (self.course_code,))
-		results = pd.DataFrame(results, columns=['original_question', 'text_answer', 'count'])
+		""".format(field_name, ', '.join(['%s'] * len(self.questions)))
+		results = query_mysql(query, (self.course_code, *self.questions.values()))
 		# Return False if course has received no feedback
-		return False if results.empty else results
+		return results if results else False
+	
+	
+	def _group_answers(self):
+		"""Group answers by question as dicts {'name': answer, 'y': count} in
+		query order; with pandas if there are more than PANDAS_ROW_THRESHOLD.
+		"""
+		if self.categorical_data is False:
+			return {}
+		if use_pandas(self.categorical_data):
+			return self._group_answers_frame()
+		results = {}
+		for question, answer, count in self.categorical_data:
+			results.setdefault(question, []).append({'name': answer, 'y': count})
+		return results
+	
 	
+	def _group_answers_frame(self):
+		"""Same as _group_answers with pandas."""
+		import pandas as pd
+		data = pd.DataFrame(self.categorical_data, columns=['original_question', 'text_answer', 'count'])
+		results = {}
+		for question, group in data.groupby('original_question', sort=False):
+			results[question] = [{'name': answer, 'y': count} for (answer, count)
+								 in zip(group['text_answer'].tolist(), group['count'].tolist())]
+		return results
 	
-	def _load_categorical(self, question):
-		"""Extract and process results for a categorical question from the raw
-		data. Returns False if course has received no feedback of that type.
+	
+	def _load_categorical(self, answers, question):
+		"""Extract results for a categorical question from the grouped
+		answers. Returns False if course has received no feedback at all.
 		"""
-		# Explicitely checking 'if df is False' rather than 'if not df' as
-		# DataFrames do not have a truth value
 		if self.categorical_data is False:
 			return False
-		data_filtered = self.categorical_data.loc[self.categorical_data['original_question'] == question, :]
-		results_processed = []
-		for row in data_filtered.itertuples(index=False):
-			# Unpack tuple as some fields require customization
-			answer = row[1]
-			count = row[2]
-			# Reassemble and append
-			dict_ = {'name': answer, 'y': count}
-			results_processed.append(dict_)
-		return results_processed if results_processed else [{'name': gettext('No response'), 'y': 1}]
+		return answers.get(question) or [{'name': gettext('No response'), 'y': 1}]
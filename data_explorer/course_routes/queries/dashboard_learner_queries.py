@@ -1,6 +1,5 @@
 from flask_babel import gettext
-from data_explorer.db import query_mysql
-from data_explorer.course_routes.utils import as_string, as_int
+from data_explorer.course_routes.queries.snapshot_queries import LearnerSnapshot
 
 
 class Learners:
@@ -15,10 +14,13 @@ class Learners:
 		self.top_depts = None
 		self.course_title = None
 		self.business_type = None
+		# Course's registrations for the fiscal year, shared across the request
+		self.snapshot = None
 	
 	
 	def load(self):
-		"""Run all learner queries."""
+		"""Process all learner data from the request's LSR snapshot."""
+		self.snapshot = LearnerSnapshot.for_course(self.fiscal_year, self.course_code)
 		self._calc_regs_and_no_shows_per_month()
 		self._calc_top_classifs()
 		self._calc_top_depts()
@@ -29,24 +31,10 @@ class Learners:
 	
 	
 	def _calc_regs_and_no_shows_per_month(self):
-		"""Query number of confirmed regisrations and no-shows per
-		month; include months that have 0 of both.
+		"""Number of confirmed regisrations and no-shows per month; include
+		months that have 0 of both.
 		"""
-		field_name = 'month_{0}'.format(self.lang)
-		table_name = 'lsr_{0}'.format(self.fiscal_year)
-		# Cast SUM to dtype unsigned to prevent MySQL Python connector from
-		# returning dtype decimal
-		query = """
-			SELECT 
-				{0},
-				COUNT(CASE WHEN (reg_status = 'Confirmed') THEN reg_id END),
-				CAST(SUM(no_show) AS UNSIGNED)
-			FROM {1}
-			WHERE course_code = %s
-			GROUP BY 1;
-		""".format(field_name, table_name)
-		results = query_mysql(query, (self.course_code,))
-		results = {tup[0]: (tup[1], tup[2]) for tup in results}
+		results = self.snapshot.monthly_counts(self.lang)
 		# Process results into format required by Highcharts
 		results_processed_regs = []
 		results_processed_no_shows = []
@@ -74,34 +62,14 @@ class Learners:
 	
 	
 	def _calc_top_classifs(self):
-		"""Query the top classifications by number of registrations."""
-		table_name = 'lsr_{0}'.format(self.fiscal_year)
-		query = """
-			SELECT learner_classif, COUNT(learner_classif)
-			FROM {0}
-			WHERE course_code = %s AND reg_status = 'Confirmed'
-			GROUP BY 1
-			ORDER BY 2 DESC
-			LIMIT 5;
-		""".format(table_name)
-		results = query_mysql(query, (self.course_code,))
-		self.top_classifs = results
+		"""Top classifications by number of registrations."""
+		self.top_classifs = self.snapshot.top_counts('learner_classif')
 	
 	
 	def _calc_top_depts(self):
-		"""Query the top departments by number of registrations."""
+		"""Top departments by number of registrations."""
 		field_name = 'billing_dept_name_{0}'.format(self.lang)
-		table_name = 'lsr_{0}'.format(self.fiscal_year)
-		query = """
-			SELECT {0}, COUNT({0})
-			FROM {1}
-			WHERE course_code = %s AND reg_status = 'Confirmed'
-			GROUP BY 1
-			ORDER BY 2 DESC
-			LIMIT 5;
-		""".format(field_name, table_name)
-		results = query_mysql(query, (self.course_code,))
-		self.top_depts = results
+		self.top_depts = self.snapshot.top_counts(field_name)
 	
 	
 	def _get_course_tile(self):
@@ -110,16 +78,7 @@ class Learners:
 		table in case the course has registrations but has yet
 		to be catalogued by CM."""
 		field_name = 'course_title_{0}'.format(self.lang)
-		table_name = 'lsr_{0}'.format(self.fiscal_year)
-		query = """
-			SELECT {0}
-			FROM {1}
-			WHERE course_code = %s
-			LIMIT 1;
-		""".format(field_name, table_name)
-		results = query_mysql(query, (self.course_code,))
-		results = as_string(results)
-		self.course_title = results
+		self.course_title = self.snapshot.course_value(field_name)
 	
 	
 	def _get_business_type(self):
@@ -127,16 +86,7 @@ class Learners:
 		the lsr_fiscal_year table rather than the product_info
 		table in case the course has registrations but has yet
 		to be catalogued by CM."""
-		table_name = 'lsr_{0}'.format(self.fiscal_year)
-		query = """
-			SELECT business_type
-			FROM {0}
-			WHERE course_code = %s
-			LIMIT 1;
-		""".format(table_name)
-		results = query_mysql(query, (self.course_code,))
-		results = as_string(results)
-		self.business_type = results
+		self.business_type = self.snapshot.course_value('business_type')
 
 
 class OverallLearnerNumbers:
@@ -150,48 +100,10 @@ class OverallLearnerNumbers:
 	
 	
 	def load(self):
-		"""Run all queries and process all raw data."""
-		self._calc_total_regs()
-		self._calc_unique_learners()
-		self._calc_total_no_shows()
+		"""Process all counts from the request's LSR snapshot."""
+		snapshot = LearnerSnapshot.for_course(self.fiscal_year, self.course_code)
+		self.counts.append((gettext('Registrations'), snapshot.total_regs()))
+		self.counts.append((gettext('Unique Learners'), snapshot.unique_learners()))
+		self.counts.append((gettext('No-Shows'), snapshot.total_no_shows()))
 		# Return self to allow method chaining
 		return self
-	
-	
-	def _calc_total_regs(self):
-		"""Query total number of confirmed registrations."""
-		table_name = 'lsr_{0}'.format(self.fiscal_year)
-		query = """
-			SELECT COUNT(reg_id)
-			FROM {0}
-			WHERE course_code = %s AND reg_status = 'Confirmed';
-		""".format(table_name)
-		results = query_mysql(query, (self.course_code,))
-		results_processed = (gettext('Registrations'), as_int(results))
-		self.counts.append(results_processed)
-	
-	
-	def _calc_unique_learners(self):
-		"""Query total number of unique learners."""
-		table_name = 'lsr_{0}'.format(self.fiscal_year)
-		query = """
-			SELECT COUNT(DISTINCT learner_id)
-			FROM {0}
-			WHERE course_code = %s AND reg_status = 'Confirmed';
-		""".format(table_name)
-		results = query_mysql(query, (self.course_code,))
-		results_processed = (gettext('Unique Learners'), as_int(results))
-		self.counts.append(results_processed)
-	
-	
-	def _calc_total_no_shows(self):
-		"""Query total number of no-shows."""
-		table_name = 'lsr_{0}'.format(self.fiscal_year)
-		query = """
-			SELECT SUM(no_show)
-			FROM {0}
-			WHERE course_code = %s;
-		""".format(table_name)
-		results = query_mysql(query, (self.course_code,))
-		results_processed = (gettext('No-Shows'), as_int(results))
-		self.counts.append(results_processed)
@@ -1,7 +1,9 @@
-import pandas as pd
+from collections import defaultdict
 from flask_babel import gettext
+from data_explorer.cache import cached
 from data_explorer.db import query_mysql
 from data_explorer.course_routes.utils import as_float, as_int, as_percent
+from data_explorer.course_routes.queries.snapshot_queries import LearnerSnapshot, OfferingSnapshot
 
 
 class OfferingLocations:
@@ -27,33 +29,20 @@ class OfferingLocations:
 	
 	
 	def _load_all_locations(self):
-		"""Query the DB and extract all offering location data for a given
-		course code.
+		"""Extract all offering location data for a given course code from
+		the request's offerings snapshot as a sorted list of tuples (region,
+		province, city, count).
 		"""
-		field_name_1 = 'offering_region_{0}'.format(self.lang)
-		field_name_2 = 'offering_province_{0}'.format(self.lang)
-		field_name_3 = 'offering_city_{0}'.format(self.lang)
-		query = """
-			SELECT {0}, {1}, {2}, COUNT(offering_id)
-			FROM offerings
-			WHERE
-				course_code = %s
-				AND
-				offering_status IN ('Open - Normal', 'Delivered - Normal')
-				AND
-				fiscal_year = %s
-			GROUP BY 1, 2, 3;
-		""".format(field_name_1, field_name_2, field_name_3)
-		results = query_mysql(query, (self.course_code, self.fiscal_year))
-		results = pd.DataFrame(results, columns=['offering_region', 'offering_province', 'offering_city', 'count'])
-		self.data = results
+		snapshot = OfferingSnapshot.for_course(self.course_code)
+		self.data = snapshot.location_counts(self.lang, self.fiscal_year)
 	
 	
 	def _region_drilldown(self):
 		"""Calculate number of offerings per region; include regions with 0
 		offerings."""
-		results = self.data.groupby('offering_region', as_index=False).sum()
-		results = dict(results.values.tolist())
+		results = defaultdict(int)
+		for region, province, city, count in self.data:
+			results[region] += count
 		# Explicitly declare list of regions as want to show all, even if count 0
 		regions = [
 			gettext('Atlantic'),
@@ -70,30 +59,40 @@ class OfferingLocations:
 	
 	def _province_drilldown(self):
 		"""Calculate number of offerings per province; link provinces to regions."""
-		# Get list of regions in which the course has offerings
-		regions = self.data.loc[:, 'offering_region'].unique()
-		# Counts by province
-		counts = self.data.groupby(['offering_region', 'offering_province'], as_index=False).sum()
-		# Process into form required by Highcharts
-		results_processed = {}
-		for region in regions:
-			province_counts = counts.loc[counts['offering_region'] == region, ['offering_province', 'count']].values.tolist()
-			province_counts_processed = self._process_counts(province_counts)
-			results_processed[region] = province_counts_processed
+		# Counts by province within each region in which the course has offerings
+		counts = {}
+		for region, province, city, count in self.data:
+			# Offerings missing a region count towards the total only
+			if region is None:
+				continue
+			# Regions whose provinces are all missing still get an empty
+			# drilldown, as the region chart links to one
+			region_counts = counts.setdefault(region, {})
+			if province is None:
+				continue
+			region_counts[province] = region_counts.get(province, 0) + count
+		# Process into form required by Highcharts; data is sorted so provinces are too
+		results_processed = {region: self._process_counts(list(region_counts.items()))
+							 for (region, region_counts) in counts.items()}
 		self.provinces = results_processed
 	
 	
 	def _city_drilldown(self):
 		"""Calculate number of offerings per city; link cities to provinces."""
-		# Get list of provinces in which the course has offerings
-		provinces = self.data.loc[:, 'offering_province'].unique()
-		# Counts by city
-		counts = self.data.groupby(['offering_province', 'offering_city'], as_index=False).sum()
+		# Counts by city within each province in which the course has offerings;
+		# a province may span regions e.g. Ontario in NCR and Ontario Region
+		counts = {}
+		for region, province, city, count in self.data:
+			if province is None:
+				continue
+			# Likewise for provinces whose cities are all missing
+			province_counts = counts.setdefault(province, {})
+			if city is None:
+				continue
+			province_counts[city] = province_counts.get(city, 0) + count
 		# Process into form required by Highcharts
-		results_processed = {}
-		for province in provinces:
-			city_counts = counts.loc[counts['offering_province'] == province, ['offering_city', 'count']].values.tolist()
-			results_processed[province] = city_counts
+		results_processed = {province: [[city, count] for (city, count) in sorted(province_counts.items())]
+							 for (province, province_counts) in counts.items()}
 		self.cities = results_processed
 	
 	
@@ -125,16 +124,9 @@ class OverallOfferingNumbers:
 	
 	
 	def _offering_status_counts(self):
-		"""Query number of offerings by status for a given fiscal year."""
-		query = """
-			SELECT offering_status, COUNT(offering_id)
-			FROM offerings
-			WHERE course_code = %s AND fiscal_year = %s
-			GROUP BY 1;
-		"""
-		results = query_mysql(query, (self.course_code, self.fiscal_year))
+		"""Number of offerings by status for a given fiscal year."""
+		results = OfferingSnapshot.for_course(self.course_code).status_counts(self.fiscal_year)
 		# Ensure all possible statuses returned
-		results = dict(results)
 		statuses = {
 			gettext('Open Offerings'): 'Open - Normal',
 			gettext('Delivered Offerings'): 'Delivered - Normal',
@@ -146,61 +138,19 @@ class OverallOfferingNumbers:
 	
 	def _offering_additional_counts(self):
 		"""Additional offering counts used by School analysts."""
-		query_client_reqs = """
-			SELECT COUNT(offering_id)
-			FROM offerings
-			WHERE
-				course_code = %s
-				AND
-				client != ''
-				AND
-				offering_status IN ('Open - Normal', 'Delivered - Normal')
-				AND
-				fiscal_year = %s;
-		"""
-		client_reqs = query_mysql(query_client_reqs, (self.course_code, self.fiscal_year))
-		results = (gettext('Client Requests'), as_int(client_reqs))
+		client_reqs = OfferingSnapshot.for_course(self.course_code).client_requests(self.fiscal_year)
+		results = (gettext('Client Requests'), client_reqs)
 		self.counts.append(results)
 
 
 def offerings_per_region_and_quarter(lang, fiscal_year, course_code):
-	field_name = 'offering_region_{0}'.format(lang)
-	query = """
-		SELECT {0}, quarter, COUNT(offering_id)
-		FROM offerings
-		WHERE
-			course_code = %s
-			AND
-			fiscal_year = %s
-			AND
-			offering_status IN ('Open - Normal', 'Delivered - Normal')
-		GROUP BY 1, 2;
-	""".format(field_name)
-	results = query_mysql(query, (course_code, fiscal_year))
-	
-	# Process into nested dictionaries of format {'Atlantic': {'Q1': 2}, ...}
-	results_processed = { tup[0]: {} for tup in results }
-	for tup in results:
-		results_processed[tup[0]][tup[1]] = tup[2]
-	return results_processed
+	# Nested dictionaries of format {'Atlantic': {'Q1': 2}, ...}
+	return OfferingSnapshot.for_course(course_code).region_and_quarter_counts(lang, fiscal_year)
 
 
 def offerings_per_lang(fiscal_year, course_code):
-	query = """
-		SELECT offering_language, COUNT(offering_id)
-		FROM offerings
-		WHERE
-			course_code = %s
-			AND
-			offering_status IN ('Open - Normal', 'Delivered - Normal')
-			AND
-			fiscal_year = %s
-		GROUP BY 1;
-	"""
-	results = query_mysql(query, (course_code, fiscal_year))
-	
+	results = OfferingSnapshot.for_course(course_code).language_counts(fiscal_year)
 	# Force 'English', 'French', and 'Bilingual' to be returned within dict
-	results = dict(results)
 	if 'English' not in results:
 		results['English'] = 0
 	if 'French' not in results:
@@ -211,32 +161,12 @@ def offerings_per_lang(fiscal_year, course_code):
 
 
 def offerings_cancelled(fiscal_year, course_code):
-	query = """
-		SELECT SUM(a.Mars / b.Mars)
-		FROM (
-			SELECT COUNT(offering_id) AS Mars
-			FROM offerings
-			WHERE
-			course_code = %s
-			AND
-			offering_status = 'Cancelled - Normal'
-			AND
-			fiscal_year = %s
-		) AS a,
-		(
-			SELECT COUNT(offering_id) AS Mars
-			FROM offerings
-			WHERE
-			course_code = %s
-			AND
-			fiscal_year = %s
-		) AS b;
-	"""
-	results = query_mysql(query, (course_code, fiscal_year, course_code, fiscal_year))
-	return as_percent(results)
+	return OfferingSnapshot.for_course(course_code).cancelled_percent(fiscal_year)
 
 
+@cached('offerings_cancelled_global')
 def offerings_cancelled_global(fiscal_year):
+	"""Course-independent benchmark; cached per fiscal year until the next data load."""
 	query = """
 		SELECT SUM(a.Mars / b.Mars)
 		FROM (
@@ -263,21 +193,12 @@ def offerings_cancelled_global(fiscal_year):
 
 
 def avg_class_size(fiscal_year, course_code):
-	table_name = 'lsr_{0}'.format(fiscal_year)
-	query = """
-		SELECT AVG(class_size)
-		FROM (
-			SELECT COUNT(reg_id) AS class_size
-			FROM {0}
-			WHERE course_code = %s AND reg_status= 'Confirmed'
-			GROUP BY offering_id
-		) AS a;
-	""".format(table_name)
-	results = query_mysql(query, (course_code,))
-	return as_int(results)
+	return LearnerSnapshot.for_course(fiscal_year, course_code).avg_class_size()
 
 
+@cached('avg_class_size_global')
 def avg_class_size_global(fiscal_year):
+	"""Course-independent benchmark; cached per fiscal year until the next data load."""
 	table_name = 'lsr_{0}'.format(fiscal_year)
 	query = """
 		SELECT AVG(class_size)
@@ -293,25 +214,12 @@ def avg_class_size_global(fiscal_year):
 
 
 def avg_no_shows(fiscal_year, course_code):
-	table_name = 'lsr_{0}'.format(fiscal_year)
-	query = """
-		SELECT SUM(a.Mars / b.Mars)
-		FROM (
-			SELECT SUM(no_show) AS Mars
-			FROM {0}
-			WHERE course_code = %s
-		) AS a,
-		(
-			SELECT COUNT(DISTINCT offering_id) AS Mars
-			FROM {0}
-			WHERE course_code = %s AND offering_status IN ('Open - Normal', 'Delivered - Normal')
-		) AS b;
-	""".format(table_name)
-	results = query_mysql(query, (course_code, course_code))
-	return as_float(results)
+	return LearnerSnapshot.for_course(fiscal_year, course_code).avg_no_shows()
 
 
+@cached('avg_no_shows_global')
 def avg_no_shows_global(fiscal_year):
+	"""Course-independent benchmark; cached per fiscal year until the next data load."""
 	table_name = 'lsr_{0}'.format(fiscal_year)
 	query = """
 		SELECT SUM(a.Mars / b.Mars)
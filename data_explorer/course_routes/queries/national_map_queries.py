@@ -0,0 +1,131 @@
+from flask import current_app
+from data_explorer.cache import cached
+from data_explorer.config import Config
+from data_explorer.db import query_mysql
+from data_explorer.course_routes.queries.snapshot_queries import ACTIVE_STATUSES
+
+# Kinds of national map
+KINDS = ('offerings', 'learners')
+
+# Confirmed registrations per location, business type, region, and year across
+# all courses in both LSR tables
+LEARNER_QUERY = """
+	SELECT learner_lat, learner_lng, business_type, offering_region_en, offering_region_fr, %s, COUNT(reg_id)
+	FROM lsr_last_year
+	WHERE reg_status = 'Confirmed' AND learner_lat IS NOT NULL AND learner_lng IS NOT NULL
+	GROUP BY 1, 2, 3, 4, 5
+	UNION ALL
+	SELECT learner_lat, learner_lng, business_type, offering_region_en, offering_region_fr, %s, COUNT(reg_id)
+	FROM lsr_this_year
+	WHERE reg_status = 'Confirmed' AND learner_lat IS NOT NULL AND learner_lng IS NOT NULL
+	GROUP BY 1, 2, 3, 4, 5;
+"""
+
+# Open and delivered offerings per location, business type, region, and year
+# across all courses
+OFFERING_QUERY = """
+	SELECT offering_lat, offering_lng, business_type, offering_region_en, offering_region_fr, fiscal_year, COUNT(offering_id)
+	FROM offerings
+	WHERE
+		offering_status IN (%s, %s)
+		AND
+		fiscal_year IN (%s, %s)
+		AND
+		offering_lat IS NOT NULL AND offering_lng IS NOT NULL
+	GROUP BY 1, 2, 3, 4, 5, 6;
+"""
+
+
+class NationalPoints:
+	"""Counts of learners or offerings per location across all courses, held
+	as NumPy arrays so that filtering and binning are vectorized rather than
+	done per course or per row.
+	
+	Business types, regions, and years are stored as integer codes, in the
+	order of their sorted distinct values.
+	"""
+	filter_fields = ['business_type', 'region_en', 'region_fr', 'year']
+	
+	def __init__(self, kind):
+		self.kind = kind
+		self.lat = None
+		self.lng = None
+		self.count = None
+		# Dicts mapping each of filter_fields to a dict of its distinct values
+		# to their codes, and to each row's code
+		self.values = {}
+		self.codes = {}
+	
+	
+	def load(self):
+		"""Run query, in a single scan of each table, and store results."""
+		import numpy as np
+		if self.kind == 'learners':
+			results = query_mysql(LEARNER_QUERY, (Config.LAST_YEAR, Config.THIS_YEAR))
+		else:
+			results = query_mysql(OFFERING_QUERY, tuple(ACTIVE_STATUSES) + (Config.LAST_YEAR, Config.THIS_YEAR))
+		columns = list(zip(*results)) if results else [()] * 7
+		self.lat = np.array(columns[0], dtype=np.float64)
+		self.lng = np.array(columns[1], dtype=np.float64)
+		self.count = np.array(columns[6], dtype=np.int64)
+		for field_name, column in zip(self.filter_fields, columns[2:6]):
+			column = np.array(['' if value is None else str(value) for value in column], dtype=object)
+			values, codes = np.unique(column, return_inverse=True)
+			self.values[field_name] = {value: code for code, value in enumerate(values.tolist())}
+			self.codes[field_name] = codes
+		# Return self to allow method chaining
+		return self
+	
+	
+	def filters(self, lang):
+		"""Values each filter accepts, for a form's options."""
+		fields = {'business_type': 'business_type', 'region': 'region_{0}'.format(lang), 'year': 'year'}
+		# Values are sorted by code; '' stands for missing values
+		return {name: [value for value in self.values[field_name] if value] for name, field_name in fields.items()}
+	
+	
+	def bins(self, lang, bin_degrees, business_type=None, region=None, year=None):
+		"""Sum counts into a grid of cells bin_degrees wide, keeping rows
+		matching every filter given. Returns lists of form [latitude,
+		longitude, count], largest first, with each cell placed at its
+		count-weighted centroid.
+		"""
+		import numpy as np
+		mask = np.ones(len(self.count), dtype=bool)
+		for field_name, value in [('business_type', business_type), ('region_{0}'.format(lang), region), ('year', year)]:
+			if value is None:
+				continue
+			code = self.values[field_name].get(value)
+			if code is None:
+				return []
+			mask &= self.codes[field_name] == code
+		lat, lng, count = self.lat[mask], self.lng[mask], self.count[mask]
+		if not len(count):
+			return []
+		# Number each cell row by row from the south-west
+		n_cols = int(np.ceil(360.0 / bin_degrees)) + 1
+		row = np.floor((lat + 90.0) / bin_degrees).astype(np.int64)
+		col = np.floor((lng + 180.0) / bin_degrees).astype(np.int64)
+		_, inverse = np.unique(row * n_cols + col, return_inverse=True)
+		totals = np.bincount(inverse, weights=count)
+		lat_centroids = np.bincount(inverse, weights=lat * count) / totals
+		lng_centroids = np.bincount(inverse, weights=lng * count) / totals
+		order = np.argsort(-totals, kind='mergesort')
+		return [[round(lat_c, 4), round(lng_c, 4), int(total)]
+				for lat_c, lng_c, total in zip(lat_centroids[order].tolist(), lng_centroids[order].tolist(), totals[order].tolist())]
+
+
+@cached('national_map_points')
+def national_points(kind):
+	"""Points of the national map for kind; cached until the next data load."""
+	return NationalPoints(kind).load()
+
+
+@cached('national_map')
+def national_map(kind, lang, business_type, region, year):
+	"""Binned national map for kind, filtered by business type, region, and
+	year, each None for all; cached until the next data load. Check filters
+	against national_points(kind).filters(lang) first to bound the cache.
+	"""
+	points = national_points(kind)
+	return points.bins(lang, current_app.config['NATIONAL_MAP_BIN_DEGREES'], business_type, region, year)
@@ -1,5 +1,7 @@
 import datetime
-from data_explorer.db import query_mysql
+from flask import current_app
+from data_explorer.cache import cached
+from data_explorer.course_routes.queries.snapshot_queries import OfferingSnapshot
 
 # If offering has more than n confirmed registrations, it will remain
 # on the books and not be cancelled
@@ -11,53 +13,87 @@ COLOR_DICT = {
 	'ORANGE': '#fff3cd',
 	'RED': '#f8d7da'
 }
+# Offerings less than this far away with few registrations are at risk
+HORIZON = datetime.timedelta(days=30)
 
 
-def offerings_scheduled(lang, fiscal_year, course_code):
+def offerings_scheduled(lang, fiscal_year, course_code, date_1=None, date_2=None, status=None):
 	"""Data for the Schedule tab, purpose of which is to allow users to 
-	browse see offerings this fiscal year.
+	browse see offerings this fiscal year, most recent first. Optionally
+	only those starting from date_1 and / or up to date_2, and of status.
 	"""
-	field_name_1 = 'offering_city_{0}'.format(lang)
-	field_name_2 = 'offering_province_{0}'.format(lang)
-	query = """
-		SELECT offering_id, start_date, end_date, {0} as offering_city, {1} as offering_province,
-			offering_language, instructor_names, confirmed_count, cancelled_count, waitlisted_count,
-			no_show_count, client, offering_status
-		FROM offerings
-		WHERE course_code = %s AND fiscal_year >= %s
-		ORDER BY 2 DESC;
-	""".format(field_name_1, field_name_2)
-	results = query_mysql(query, (course_code, fiscal_year), dict_=True)
-	# Assign background colours
-	results_processed = []
+	results = _scheduled(lang, fiscal_year, course_code)
+	if date_1 is not None:
+		results = [dict_ for dict_ in results if dict_['start_date'] is not None and dict_['start_date'] >= date_1]
+	if date_2 is not None:
+		results = [dict_ for dict_ in results if dict_['start_date'] is not None and dict_['start_date'] <= date_2]
+	if status:
+		results = [dict_ for dict_ in results if dict_['offering_status'] == status]
+	return results
+
+
+@cached('offerings_scheduled')
+def _scheduled(lang, fiscal_year, course_code):
+	"""All of the Schedule tab's offerings, cached per course until the next
+	data load so that paging through them doesn't reload the snapshot.
+	"""
+	return OfferingSnapshot.for_course(course_code).scheduled(lang, fiscal_year)
+
+
+def assign_background_colors(results, today, field_name='color'):
+	"""Set key field_name of each of results, dicts of offerings, to its
+	background colour given its dates, number of confirmed registrations,
+	and status relative to today. Results of more than
+	VECTORIZE_ROW_THRESHOLD offerings e.g. the Calendar page's are
+	classified in one vectorized pass, smaller ones e.g. a page of the
+	Schedule tab one by one.
+	"""
+	if len(results) > current_app.config['VECTORIZE_ROW_THRESHOLD']:
+		return _assign_background_colors_vectorized(results, today, field_name)
 	for dict_ in results:
-		temp_dict = dict_
-		start_date = temp_dict['start_date']
-		end_date = temp_dict['end_date']
-		confirmed_count = temp_dict['confirmed_count']
-		offering_status = temp_dict['offering_status']
-		temp_dict['color'] = _assign_background_color(start_date, end_date, confirmed_count, offering_status)
-		results_processed.append(temp_dict)
-	return results_processed
-
-
-def _assign_background_color(start_date, end_date, confirmed_count, offering_status):
-	"""Assign offerings a background colour given their start date, number of
-	confirmed registrations, and status.
+		dict_[field_name] = _assign_background_color(dict_['start_date'], dict_['end_date'],
+													 dict_['confirmed_count'], dict_['offering_status'], today)
+	return results
+
+
+def _assign_background_colors_vectorized(results, today, field_name):
+	"""Same as assign_background_colors with NumPy."""
+	import numpy as np
+	# Compare dates as ordinals; missing ones never match a date condition
+	start = np.array([_ordinal(dict_['start_date']) for dict_ in results], dtype=float)
+	end = np.array([_ordinal(dict_['end_date']) for dict_ in results], dtype=float)
+	confirmed = np.array([dict_['confirmed_count'] or 0 for dict_ in results], dtype=np.int64)
+	cancelled = np.array([dict_['offering_status'] == 'Cancelled - Normal' for dict_ in results], dtype=bool)
+	# In order of precedence, as in _assign_background_color
+	palette = [COLOR_DICT['RED'], COLOR_DICT['GREY'], COLOR_DICT['GREEN'], COLOR_DICT['ORANGE']]
+	codes = np.select(
+		[cancelled, end < today.toordinal(), (start >= (today + HORIZON).toordinal()) | (confirmed >= CONFIRMED_COUNT_THRESHOLD)],
+		[0, 1, 2],
+		default=3
+	)
+	for dict_, code in zip(results, codes.tolist()):
+		dict_[field_name] = palette[code]
+	return results
+
+
+def _ordinal(date):
+	return date.toordinal() if date is not None else float('nan')
+
+
+def _assign_background_color(start_date, end_date, confirmed_count, offering_status, today):
+	"""Assign an offering a background colour given its start date, number
+	of confirmed registrations, and status. Missing dates match no date
+	condition.
 	"""
-	# MySQL returns values from date columns as Python datetime objects, which makes
-	# for easy comparison
-	current_date = datetime.date.today()
-	thirty_days_from_now = current_date + datetime.timedelta(days=30)
 	# If offering has been cancelled, red
 	# Place this before date check to properly display past offerings that were cancelled
 	if offering_status == 'Cancelled - Normal':
 		return COLOR_DICT['RED']
 	# If offering has already taken place, grey
-	if end_date < current_date:
+	if end_date is not None and end_date < today:
 		return COLOR_DICT['GREY']
 	# If offering more than a month away or has more than 10 confirmed registrations, green
-	if (start_date >= thirty_days_from_now) or (confirmed_count >= CONFIRMED_COUNT_THRESHOLD):
+	if (start_date is not None and start_date >= today + HORIZON) or (confirmed_count or 0) >= CONFIRMED_COUNT_THRESHOLD:
 		return COLOR_DICT['GREEN']
 	# Else, orange
 	return COLOR_DICT['ORANGE']
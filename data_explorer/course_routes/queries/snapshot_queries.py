@@ -0,0 +1,634 @@
+from collections import Counter
+from flask import current_app
+from data_explorer.config import Config
+from data_explorer.db import query_mysql
+from data_explorer.course_routes.utils import request_memo, use_pandas
+
+# pandas is imported where used rather than here so that starting a
+# worker, and serving pages that don't need it, doesn't pay for it
+
+# Offerings that count towards the dashboards
+ACTIVE_STATUSES = ['Open - Normal', 'Delivered - Normal']
+# Stands in for NULL keys when grouping with pandas, which drops them
+_MISSING = '\x00'
+
+
+class OfferingSnapshot:
+	"""All of a course's offerings from LAST_YEAR onwards, fetched in a single
+	query and shared by every offering dashboard, the offering map, and the
+	Schedule tab for the life of the request.
+	
+	Aggregates are computed in plain Python over the raw rows, or with
+	pandas if the course has more than PANDAS_ROW_THRESHOLD offerings.
+	Both give the same results.
+	"""
+	columns = [
+		'offering_id', 'fiscal_year', 'quarter', 'offering_status', 'client',
+		'offering_language', 'offering_region_en', 'offering_region_fr',
+		'offering_province_en', 'offering_province_fr', 'offering_city_en',
+		'offering_city_fr', 'offering_lat', 'offering_lng', 'start_date', 'end_date',
+		'instructor_names', 'confirmed_count', 'cancelled_count', 'waitlisted_count',
+		'no_show_count'
+	]
+	
+	def __init__(self, course_code):
+		self.course_code = course_code
+		# Raw rows as dicts, ordered by start date desc; kept for the Schedule
+		# tab so that counts and dates keep their MySQL types
+		self.rows = None
+		# Whether to aggregate with pandas
+		self.large = False
+		# Same rows in a DataFrame, built on first use by the pandas paths
+		self._data = None
+	
+	
+	@classmethod
+	def for_course(cls, course_code):
+		"""Return the request's snapshot for course_code, loading it on first use."""
+		return request_memo(('offering_snapshot', course_code), lambda: cls(course_code).load())
+	
+	
+	def load(self):
+		"""Run query and store results."""
+		query = """
+			SELECT {0}
+			FROM offerings
+			WHERE course_code = %s AND fiscal_year >= %s
+			ORDER BY start_date DESC;
+		""".format(', '.join(self.columns))
+		self.rows = query_mysql(query, (self.course_code, Config.LAST_YEAR), dict_=True)
+		self.large = use_pandas(self.rows)
+		# Return self to allow method chaining
+		return self
+	
+	
+	@property
+	def data(self):
+		"""Rows in a DataFrame."""
+		if self._data is None:
+			import pandas as pd
+			self._data = pd.DataFrame(self.rows, columns=self.columns)
+		return self._data
+	
+	
+	def _year(self, fiscal_year, active_only=False):
+		"""Filter to a fiscal year and optionally to open and delivered offerings."""
+		mask = self.data['fiscal_year'] == fiscal_year
+		if active_only:
+			mask &= self.data['offering_status'].isin(ACTIVE_STATUSES)
+		return self.data.loc[mask, :]
+	
+	
+	def _year_rows(self, fiscal_year, active_only=False):
+		"""Same as _year for the raw rows."""
+		return [row for row in self.rows if row['fiscal_year'] == fiscal_year
+				and (not active_only or row['offering_status'] in ACTIVE_STATUSES)]
+	
+	
+	def status_counts(self, fiscal_year):
+		"""Number of offerings per status e.g. {'Open - Normal': 4, ...}."""
+		if not self.large:
+			return _value_counts(row['offering_status'] for row in self._year_rows(fiscal_year))
+		counts = self._year(fiscal_year)['offering_status'].value_counts()
+		return {status: int(count) for (status, count) in counts.items()}
+	
+	
+	def client_requests(self, fiscal_year):
+		"""Number of open or delivered offerings requested by a client."""
+		if not self.large:
+			return sum(1 for row in self._year_rows(fiscal_year, active_only=True) if row['client'] not in (None, ''))
+		client = self._year(fiscal_year, active_only=True)['client']
+		return int((client.notnull() & (client != '')).sum())
+	
+	
+	def location_counts(self, lang, fiscal_year):
+		"""Number of open or delivered offerings per region, province, and
+		city as a list of tuples (region, province, city, count), sorted.
+		Offerings missing any of the three are kept under None, as by
+		GROUP BY.
+		"""
+		fields = ['offering_region_{0}'.format(lang), 'offering_province_{0}'.format(lang),
+				  'offering_city_{0}'.format(lang)]
+		if not self.large:
+			counts = Counter(tuple(row[field] for field in fields)
+							 for row in self._year_rows(fiscal_year, active_only=True)).items()
+		else:
+			data = self._year(fiscal_year, active_only=True)
+			if data.empty:
+				return []
+			counts = _group_sizes(data, fields)
+		return [(*key, int(count)) for (key, count) in sorted(counts, key=_none_last)]
+	
+	
+	def region_and_quarter_counts(self, lang, fiscal_year):
+		"""Number of open or delivered offerings per region and quarter in
+		nested dictionaries of format {'Atlantic': {'Q1': 2}, ...}. Offerings
+		missing either are kept under None, as by GROUP BY.
+		"""
+		field_name = 'offering_region_{0}'.format(lang)
+		if not self.large:
+			counts = Counter((row[field_name], row['quarter'])
+							 for row in self._year_rows(fiscal_year, active_only=True)).items()
+		else:
+			data = self._year(fiscal_year, active_only=True)
+			if data.empty:
+				return {}
+			counts = _group_sizes(data, [field_name, 'quarter'])
+		results = {}
+		for (region, quarter), count in sorted(counts, key=_none_last):
+			results.setdefault(region, {})[quarter] = int(count)
+		return results
+	
+	
+	def language_counts(self, fiscal_year):
+		"""Number of open or delivered offerings per language."""
+		if not self.large:
+			return _value_counts(row['offering_language'] for row in self._year_rows(fiscal_year, active_only=True))
+		counts = self._year(fiscal_year, active_only=True)['offering_language'].value_counts()
+		return {language: int(count) for (language, count) in counts.items()}
+	
+	
+	def cancelled_percent(self, fiscal_year):
+		"""Percentage of the fiscal year's offerings that were cancelled."""
+		if not self.large:
+			statuses = [row['offering_status'] for row in self._year_rows(fiscal_year)]
+			if not statuses:
+				return 0.0
+			return round(statuses.count('Cancelled - Normal') / len(statuses), 2) * 100
+		statuses = self._year(fiscal_year)['offering_status']
+		if statuses.empty:
+			return 0.0
+		return round(float((statuses == 'Cancelled - Normal').mean()), 2) * 100
+	
+	
+	def city_counts(self, lang, fiscal_year):
+		"""Open or delivered offerings per city, largest first, as nested
+		lists of form ['city_name', count, latitude, longitude]. Cities
+		without coordinates are dropped.
+		"""
+		field_name = 'offering_city_{0}'.format(lang)
+		if not self.large:
+			return self._city_counts_rows(field_name, fiscal_year)
+		data = self._year(fiscal_year, active_only=True)
+		if data.empty:
+			return []
+		counts = data.groupby(field_name).agg({'offering_id': 'count', 'offering_lat': 'first', 'offering_lng': 'first'})
+		counts = counts.loc[counts['offering_lat'].notnull(), :]
+		# Stable sort so that ties keep alphabetical order
+		counts = counts.sort_values('offering_id', ascending=False, kind='mergesort')
+		return [[city, int(row.offering_id), float(row.offering_lat), float(row.offering_lng)]
+				for city, row in zip(counts.index, counts.itertuples(index=False))]
+	
+	
+	def _city_counts_rows(self, field_name, fiscal_year):
+		"""Same as city_counts for the raw rows: counts non-null offering
+		IDs and takes each city's first non-null coordinates, as pandas'
+		'count' and 'first' do.
+		"""
+		cities = {}
+		for row in self._year_rows(fiscal_year, active_only=True):
+			if row[field_name] is None:
+				continue
+			city = cities.setdefault(row[field_name], [0, None, None])
+			if row['offering_id'] is not None:
+				city[0] += 1
+			if city[1] is None:
+				city[1] = row['offering_lat']
+			if city[2] is None:
+				city[2] = row['offering_lng']
+		results = [[name, count, float(lat), float(lng)] for (name, (count, lat, lng)) in sorted(cities.items())
+				   if lat is not None]
+		# Stable sort so that ties keep alphabetical order
+		results.sort(key=lambda city: city[1], reverse=True)
+		return results
+	
+	
+	def scheduled(self, lang, fiscal_year):
+		"""All offerings from fiscal_year onwards, most recent first, as
+		dicts with city and province in lang.
+		"""
+		if fiscal_year < Config.LAST_YEAR:
+			raise ValueError('Snapshot only holds offerings from {0} onwards.'.format(Config.LAST_YEAR))
+		results = []
+		for row in self.rows:
+			if row['fiscal_year'] < fiscal_year:
+				continue
+			results.append({
+				'offering_id': row['offering_id'],
+				'start_date': row['start_date'],
+				'end_date': row['end_date'],
+				'offering_city': row['offering_city_{0}'.format(lang)],
+				'offering_province': row['offering_province_{0}'.format(lang)],
+				'offering_language': row['offering_language'],
+				'instructor_names': row['instructor_names'],
+				'confirmed_count': row['confirmed_count'],
+				'cancelled_count': row['cancelled_count'],
+				'waitlisted_count': row['waitlisted_count'],
+				'no_show_count': row['no_show_count'],
+				'client': row['client'],
+				'offering_status': row['offering_status']
+			})
+		return results
+
+
+class LearnerSnapshot:
+	"""A course's registrations in one LSR table, shared by the learner
+	dashboards, the offering dashboards' class size metrics, and the
+	learner map for the life of the request.
+	
+	Courses with at most LEARNER_FETCH_THRESHOLD registrations are fetched
+	in a single query and aggregated in plain Python. Larger ones, found by
+	probing for a registration past the threshold, are instead aggregated
+	by MySQL in a single query of one grouping level per aggregate (see
+	aggregate_levels), so that their rows never leave it. Both give the
+	same results; ties in counts are broken by value, ascending.
+	"""
+	columns = [
+		'reg_id', 'reg_status', 'no_show', 'learner_id', 'offering_id',
+		'offering_status', 'month_en', 'month_fr', 'billing_dept_name_en',
+		'billing_dept_name_fr', 'learner_classif', 'learner_city_en',
+		'learner_city_fr', 'learner_lat', 'learner_lng', 'course_title_en',
+		'course_title_fr', 'business_type'
+	]
+	# Condition on registrations counted as confirmed
+	confirmed_condition = "reg_status = 'Confirmed' AND reg_id IS NOT NULL"
+	# Grouping levels of the aggregate of large courses, as tuples (level,
+	# offering_id, keys, values, group_by, confirmed_only); keys and values
+	# are padded with NULL to three columns each
+	aggregate_levels = [
+		('offerings', 'offering_id', ['offering_status', 'month_en', 'month_fr'],
+		 ['COUNT(CASE WHEN {0} THEN reg_id END)'.format(confirmed_condition), 'SUM(no_show)'],
+		 'offering_id, offering_status, month_en, month_fr', False),
+		('billing_dept_name_en', 'NULL', ['billing_dept_name_en'], ['COUNT(reg_id)'], 'billing_dept_name_en', True),
+		('billing_dept_name_fr', 'NULL', ['billing_dept_name_fr'], ['COUNT(reg_id)'], 'billing_dept_name_fr', True),
+		('learner_classif', 'NULL', ['learner_classif'], ['COUNT(reg_id)'], 'learner_classif', True),
+		('learner_city_en', 'NULL', ['learner_city_en'],
+		 ['COUNT(DISTINCT learner_id)', 'MAX(learner_lat)', 'MAX(learner_lng)'], 'learner_city_en', True),
+		('learner_city_fr', 'NULL', ['learner_city_fr'],
+		 ['COUNT(DISTINCT learner_id)', 'MAX(learner_lat)', 'MAX(learner_lng)'], 'learner_city_fr', True),
+		('summary', 'NULL', ['MAX(course_title_en)', 'MAX(course_title_fr)', 'MAX(business_type)'],
+		 ['COUNT(DISTINCT CASE WHEN {0} THEN learner_id END)'.format(confirmed_condition)], None, False)
+	]
+	
+	def __init__(self, table_year, course_code):
+		# Either 'last_year' or 'this_year'
+		self.table_year = table_year
+		self.course_code = course_code
+		self.table_name = 'lsr_{0}'.format(table_year)
+		# Raw rows as dicts, or None if the course has too many to fetch
+		self.rows = None
+		# Aggregates, computed on first use
+		self._offering_months = None
+		self._summary = None
+		# Dict mapping level of aggregate_levels to its rows as tuples
+		# (offering_id, key_1, key_2, key_3, value_1, value_2, value_3), for
+		# courses with too many registrations to fetch
+		self._aggregates = None
+	
+	
+	@classmethod
+	def for_course(cls, table_year, course_code):
+		"""Return the request's snapshot for course_code, loading it on first use."""
+		return request_memo(('learner_snapshot', table_year, course_code), lambda: cls(table_year, course_code).load())
+	
+	
+	def load(self):
+		"""Run query and store results if there are few enough of them."""
+		# Probe for a registration past the threshold rather than counting
+		# or fetching them all
+		probe = """
+			SELECT 1
+			FROM {0}
+			WHERE course_code = %s
+			LIMIT 1 OFFSET %s;
+		""".format(self.table_name)
+		if query_mysql(probe, (self.course_code, current_app.config['LEARNER_FETCH_THRESHOLD'])):
+			return self
+		query = """
+			SELECT {0}
+			FROM {1}
+			WHERE course_code = %s;
+		""".format(', '.join(self.columns), self.table_name)
+		self.rows = query_mysql(query, (self.course_code,), dict_=True)
+		# Return self to allow method chaining
+		return self
+	
+	
+	def _confirmed_rows(self):
+		return [row for row in self.rows if row['reg_status'] == 'Confirmed' and row['reg_id'] is not None]
+	
+	
+	def _aggregate(self, level):
+		"""Rows of a level of aggregate_levels, all of which are computed by
+		a single query on first use.
+		"""
+		if self._aggregates is None:
+			selects = []
+			for name, offering_id, keys, values, group_by, confirmed_only in self.aggregate_levels:
+				columns = ["'{0}'".format(name), offering_id] + (keys + ['NULL'] * 3)[:3] + (values + ['NULL'] * 3)[:3]
+				selects.append("""
+					SELECT {0}
+					FROM {1}
+					WHERE course_code = %s {2}
+					{3}
+				""".format(', '.join(columns), self.table_name,
+						   'AND ' + self.confirmed_condition if confirmed_only else '',
+						   'GROUP BY {0}'.format(group_by) if group_by else ''))
+			query = '\n\t\t\t\tUNION ALL\n'.join(selects) + ';'
+			results = query_mysql(query, (self.course_code,) * len(selects))
+			self._aggregates = {name: [] for (name, *_) in self.aggregate_levels}
+			for tup in results:
+				self._aggregates[tup[0]].append(tup[1:])
+		return self._aggregates[level]
+	
+	
+	def offering_months(self):
+		"""Confirmed registrations and no-shows per offering and month as a
+		list of tuples (offering_id, offering_status, month_en, month_fr,
+		regs, no_shows).
+		"""
+		if self._offering_months is not None:
+			return self._offering_months
+		if self.rows is not None:
+			groups = {}
+			for row in self.rows:
+				key = (row['offering_id'], row['offering_status'], row['month_en'], row['month_fr'])
+				counts = groups.setdefault(key, [0, 0.0])
+				if row['reg_status'] == 'Confirmed' and row['reg_id'] is not None:
+					counts[0] += 1
+				counts[1] += _number(row['no_show'])
+			results = [(*key, regs, no_shows) for (key, (regs, no_shows)) in groups.items()]
+		else:
+			results = [(*tup[:4], int(tup[4]), _number(tup[5])) for tup in self._aggregate('offerings')]
+		self._offering_months = results
+		return results
+	
+	
+	def summary(self):
+		"""Dict of the number of unique confirmed learners, and the course's
+		titles and business type; of several, the largest, as in the course
+		registry.
+		"""
+		if self._summary is not None:
+			return self._summary
+		fields = ['course_title_en', 'course_title_fr', 'business_type']
+		if self.rows is not None:
+			results = {'unique_learners': len({row['learner_id'] for row in self._confirmed_rows()})}
+			for field_name in fields:
+				values = [row[field_name] for row in self.rows if row[field_name] is not None]
+				results[field_name] = max(values) if values else None
+		else:
+			tup = self._aggregate('summary')[0]
+			results = {'unique_learners': int(tup[4])}
+			results.update(zip(fields, tup[1:4]))
+		self._summary = results
+		return results
+	
+	
+	def monthly_counts(self, lang):
+		"""Confirmed registrations and no-shows per month in form
+		{'April': (regs, no_shows), ...}. Months without any rows are absent.
+		"""
+		index = 2 if lang == 'en' else 3
+		results = {}
+		for tup in self.offering_months():
+			regs, no_shows = results.get(tup[index], (0, 0.0))
+			results[tup[index]] = (regs + tup[4], no_shows + tup[5])
+		return {month: (regs, int(no_shows)) for (month, (regs, no_shows)) in results.items()}
+	
+	
+	def top_counts(self, field_name, n=5):
+		"""Top n values of field_name, learner_classif or billing_dept_name_en
+		or _fr, by number of confirmed registrations as a list of tuples
+		(value, count).
+		"""
+		if self.rows is not None:
+			counts = Counter(row[field_name] for row in self._confirmed_rows() if row[field_name] is not None)
+		else:
+			counts = {tup[1]: int(tup[4]) for tup in self._aggregate(field_name) if tup[1] is not None}
+		return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+	
+	
+	def course_value(self, field_name):
+		"""Value of course_title_en, course_title_fr, or business_type, or
+		False if absent or empty.
+		"""
+		value = self.summary()[field_name]
+		return str(value) if value else False
+	
+	
+	def total_regs(self):
+		return sum(tup[4] for tup in self.offering_months())
+	
+	
+	def unique_learners(self):
+		return self.summary()['unique_learners']
+	
+	
+	def total_no_shows(self):
+		return int(sum(tup[5] for tup in self.offering_months()))
+	
+	
+	def avg_class_size(self):
+		"""Average number of confirmed registrations per offering, truncated."""
+		class_sizes = Counter()
+		for tup in self.offering_months():
+			if tup[0] is not None:
+				class_sizes[tup[0]] += tup[4]
+		class_sizes = [size for size in class_sizes.values() if size]
+		return int(sum(class_sizes) / len(class_sizes)) if class_sizes else 0
+	
+	
+	def avg_no_shows(self):
+		"""Total no-shows divided by number of open or delivered offerings."""
+		offering_count = len({tup[0] for tup in self.offering_months()
+							  if tup[0] is not None and tup[1] in ACTIVE_STATUSES})
+		return float(self.total_no_shows() / offering_count) if offering_count else 0.0
+	
+	
+	def city_counts(self, lang):
+		"""Unique confirmed learners per city, largest first, as nested lists
+		of form ['city_name', count, latitude, longitude]. Cities without
+		coordinates are dropped; a city's coordinates are its largest.
+		"""
+		field_name = 'learner_city_{0}'.format(lang)
+		if self.rows is not None:
+			cities = {}
+			for row in self._confirmed_rows():
+				if row[field_name] is None:
+					continue
+				learners, lats, lngs = cities.setdefault(row[field_name], (set(), [], []))
+				learners.add(row['learner_id'])
+				if row['learner_lat'] is not None:
+					lats.append(row['learner_lat'])
+				if row['learner_lng'] is not None:
+					lngs.append(row['learner_lng'])
+			results = [(city, len(learners), max(lats) if lats else None, max(lngs) if lngs else None)
+					   for (city, (learners, lats, lngs)) in cities.items()]
+		else:
+			results = [(tup[1], *tup[4:]) for tup in self._aggregate(field_name) if tup[1] is not None]
+		results = [[city, int(count), float(lat), float(lng)] for (city, count, lat, lng) in results
+				   if lat is not None and lng is not None]
+		results.sort(key=lambda city: (-city[1], city[0]))
+		return results
+
+
+# Questions shown in the Ratings section of the Comments tab
+RATING_QUESTIONS = [
+	'3. Satisfaction - Level of detail of the content',
+	'4. Satisfaction - Quality of the content',
+	'5. Satisfaction - Language quality of the materials (English or French)',
+	'6. Satisfaction - Quality of the graphics',
+	'7. Satisfaction  Ease of navigation',
+	'10. Before this learning activity',
+	'11. After this learning activity',
+	'20. This learning activity is a valuable use of my time',
+	'21. This learning activity is relevant to my job',
+	'22. This learning activity is contributing to my performance on the job',
+	'23. I can apply what I have learned on the job'
+]
+# Overall satisfaction in the new 1 to 10 Nanos survey and the old 1 to 5 survey
+NANOS_SATISFACTION_QUESTION = '1. Satisfaction Overall'
+OLD_SATISFACTION_QUESTION = 'Overall Satisfaction'
+
+# Order of months in Highcharts series
+MONTHS = ['April', 'May', 'June', 'July', 'August', 'September',
+		  'October', 'November', 'December', 'January', 'February', 'March']
+
+
+class RatingSnapshot:
+	"""Monthly average and count of every rating and overall satisfaction
+	question for a course from LAST_YEAR onwards, fetched in a single
+	grouped query and pivoted into 12-month Highcharts series shared by
+	the Ratings and Overall Satisfaction sections for the life of the
+	request. Pivoted in plain Python, or with pandas above
+	PANDAS_ROW_THRESHOLD rows.
+	"""
+	columns = ['fiscal_year', 'original_question', 'month', 'average', 'count']
+	
+	def __init__(self, course_code):
+		self.course_code = course_code
+		# Raw rows as tuples in the order of columns
+		self.rows = None
+		# Dict mapping (fiscal_year, question) to a list of 12 dicts {'y': average, 'count': count}
+		self.series = None
+	
+	
+	@classmethod
+	def for_course(cls, course_code):
+		"""Return the request's snapshot for course_code, loading it on first use."""
+		return request_memo(('rating_snapshot', course_code), lambda: cls(course_code).load())
+	
+	
+	def load(self):
+		"""Run query and pivot results."""
+		questions = RATING_QUESTIONS + [NANOS_SATISFACTION_QUESTION, OLD_SATISFACTION_QUESTION]
+		query = """
+			SELECT fiscal_year, original_question, month_en, AVG(numerical_answer), COUNT(survey_id)
+			FROM ratings
+			WHERE
+				course_code = %s
+				AND
+				fiscal_year >= %s
+				AND
+				original_question IN ({0})
+			GROUP BY 1, 2, 3;
+		""".format(', '.join(['%s'] * len(questions)))
+		self.rows = query_mysql(query, (self.course_code, Config.LAST_YEAR, *questions))
+		self.series = self._pivot_frame() if use_pandas(self.rows) else self._pivot()
+		# Return self to allow method chaining
+		return self
+	
+	
+	def _pivot(self):
+		"""Lay each question's months out in the order of MONTHS; months
+		without answers get an average and count of None. Averages are
+		rounded as by NumPy so that results match _pivot_frame's.
+		"""
+		monthly = {}
+		for fiscal_year, question, month, average, count in self.rows:
+			if month is not None:
+				monthly.setdefault((fiscal_year, question), {})[month] = (average, count)
+		results = {}
+		for key in sorted(monthly):
+			values = [monthly[key].get(month, (None, None)) for month in MONTHS]
+			results[key] = [{'y': None if average is None else _round_half_even(float(average), 2),
+							 'count': None if count is None else int(count)}
+							for (average, count) in values]
+		return results
+	
+	
+	def _pivot_frame(self):
+		"""Same as _pivot with pandas: reindex each question's months onto
+		MONTHS.
+		"""
+		import pandas as pd
+		data = pd.DataFrame(self.rows, columns=self.columns)
+		if data.empty:
+			return {}
+		data = data.dropna(subset=['month'])
+		data = data.assign(average=data['average'].astype(float).round(2))
+		results = {}
+		for key, group in data.groupby(['fiscal_year', 'original_question']):
+			monthly = group.set_index('month').reindex(MONTHS)
+			# Cast via object so that missing months become None rather than NaN
+			averages = monthly['average'].astype(object).where(monthly['average'].notnull(), None)
+			counts = monthly['count'].astype(object).where(monthly['count'].notnull(), None)
+			results[key] = [{'y': average, 'count': None if count is None else int(count)}
+							for (average, count) in zip(averages, counts)]
+		return results
+	
+	
+	def _check_year(self, fiscal_year):
+		if fiscal_year < Config.LAST_YEAR:
+			raise ValueError('Snapshot only holds ratings from {0} onwards.'.format(Config.LAST_YEAR))
+	
+	
+	def ratings(self, fiscal_year):
+		"""Series of every rating question answered in fiscal_year, by question."""
+		self._check_year(fiscal_year)
+		return {question: self.series[(fiscal_year, question)] for question in RATING_QUESTIONS
+				if (fiscal_year, question) in self.series}
+	
+	
+	def monthly_values(self, fiscal_year, question):
+		"""Series of question in fiscal_year, or [] if never answered."""
+		self._check_year(fiscal_year)
+		return self.series.get((fiscal_year, question), [])
+
+
+def _value_counts(values):
+	"""Count non-null values, most frequent first, as Series.value_counts does."""
+	counts = Counter(value for value in values if value is not None)
+	return dict(counts.most_common())
+
+
+def _group_sizes(data, fields):
+	"""Size of each group of data by fields as pairs (key, size), keeping
+	groups in which a field is NULL with None in their key, as GROUP BY does.
+	"""
+	sizes = data.fillna({field: _MISSING for field in fields}).groupby(fields).size()
+	return [(tuple(None if value == _MISSING else value for value in key), size)
+			for (key, size) in sizes.items()]
+
+
+def _none_last(item):
+	"""Sort key for pairs (key, count) from _group_sizes, or a Counter, that
+	puts None after the other values of each field of key.
+	"""
+	return tuple((value is None, '' if value is None else value) for value in item[0])
+
+
+def _number(value):
+	"""Value of a numeric column that may be NULL, text, or Decimal as a
+	float, 0 if NULL, as MySQL's SUM treats it.
+	"""
+	return float(value) if value is not None else 0.0
+
+
+def _round_half_even(value, decimals):
+	"""Round as numpy.round does, scaling then rounding half to even, which
+	can differ from round(value, decimals) in the last digit.
+	"""
+	scale = 10 ** decimals
+	return round(value * scale) / scale
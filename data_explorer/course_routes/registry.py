@@ -0,0 +1,122 @@
+import logging
+import random
+import re
+from collections import namedtuple
+from data_explorer.cache import VersionedCache
+from data_explorer.course_routes.search import SearchIndex
+from data_explorer.db import query_mysql
+
+log = logging.getLogger(__name__)
+
+# A course as seen in the LSR; titles and business type are False if missing
+Course = namedtuple('Course', ['course_code', 'course_title_en', 'course_title_fr', 'business_type'])
+
+
+class CourseRegistry:
+	"""Every course code found in the LSR with its EN/FR titles and business
+	type, held in memory so that validation, search, and title lookups
+	don't hit the DB. Codes are stored in upper case.
+	"""
+	def __init__(self):
+		self.courses = {}
+		self.course_codes = []
+		self.search_index = None
+	
+	
+	def load(self):
+		"""Query both LSR tables and keep this year's values, falling back on
+		last year's for courses or fields missing from this year's.
+		"""
+		query = """
+			SELECT course_code, MAX(course_title_en), MAX(course_title_fr), MAX(business_type), 1
+			FROM lsr_this_year
+			GROUP BY course_code
+			UNION ALL
+			SELECT course_code, MAX(course_title_en), MAX(course_title_fr), MAX(business_type), 2
+			FROM lsr_last_year
+			GROUP BY course_code
+			ORDER BY 5 DESC;
+		"""
+		results = query_mysql(query)
+		# Last year's rows come first so this year's overwrite them
+		fields = {}
+		for tup in results:
+			if not tup[0]:
+				continue
+			course_code = str(tup[0]).upper()
+			old = fields.get(course_code, (False, False, False))
+			fields[course_code] = tuple(str(new) if new else old_val for (new, old_val) in zip(tup[1:4], old))
+		self.courses = {course_code: Course(course_code, *vals) for (course_code, vals) in fields.items()}
+		self.course_codes = sorted(self.courses)
+		# Index titles as displayed i.e. without course codes
+		titles = {course_code: {lang: _clean_title(self.title(course_code, lang) or '') for lang in ('en', 'fr')}
+				  for course_code in self.course_codes}
+		self.search_index = SearchIndex(titles)
+		log.info('Course registry loaded with %d courses', len(self.courses))
+		# Return self to allow method chaining
+		return self
+	
+	
+	def __contains__(self, course_code):
+		return course_code in self.courses
+	
+	
+	def __len__(self):
+		return len(self.courses)
+	
+	
+	def get(self, course_code):
+		"""Return the Course for course_code, or None if not in the LSR."""
+		return self.courses.get(course_code)
+	
+	
+	def title(self, course_code, lang):
+		"""Title of course_code in lang, or False if missing."""
+		course = self.courses.get(course_code)
+		return getattr(course, 'course_title_{0}'.format(lang)) if course else False
+	
+	
+	def business_type(self, course_code):
+		"""Business type of course_code, or False if missing."""
+		course = self.courses.get(course_code)
+		return course.business_type if course else False
+	
+	
+	def search(self, query, lang, limit):
+		"""Best matches for query among codes and titles; see SearchIndex."""
+		return self.search_index.search(query, lang, limit)
+	
+	
+	def random_course_code(self):
+		"""Any course code, or False if the registry is empty."""
+		return random.choice(self.course_codes) if self.course_codes else False
+
+
+# Reloaded whenever the data-load version changes and refreshed in the
+# background every CACHE_TTL seconds
+_registry = VersionedCache('course_registry', lambda: CourseRegistry().load())
+
+
+def get_registry():
+	"""Return the process's CourseRegistry, loading it if needed."""
+	return _registry.get()
+
+
+def init_app(app):
+	"""In factory function, load the registry so that the first requests
+	needn't wait for it. A failure is logged rather than raised so that the
+	app still starts if the DB is briefly unavailable; the registry is then
+	loaded on first use.
+	"""
+	with app.app_context():
+		try:
+			get_registry()
+		except Exception:
+			log.exception('Could not load course registry at startup')
+
+
+# Internal func to remove course codes from titles
+regex = re.compile(pattern=r'[(\[]{0,1}[a-zA-Z]{1}\d{3}[)\]]{0,1}')
+def _clean_title(course_title):
+	"""Remove course codes from titles."""
+	return regex.sub('', course_title).strip()
@@ -1,12 +1,15 @@
 from flask import Blueprint, render_template, request
 from data_explorer import auth
+from data_explorer.concurrency import run_concurrently
 from data_explorer.config import Config
 from data_explorer.course_routes import utils
-from data_explorer.course_routes.forms import course_form
+from data_explorer.course_routes.registry import get_registry
 from data_explorer.course_routes.queries import (
 	comment_queries, dashboard_learner_queries, dashboard_offering_queries,
 	general_queries, map_queries, rating_queries, schedule_queries
 )
+from data_explorer.etags import conditional
+from data_explorer.serialization import jsonify
 
 # Instantiate blueprint
 course = Blueprint('course', __name__)
@@ -29,15 +32,14 @@ def context_processor():
 @course.route('/home')
 @auth.login_required
 def home():
-	# Only allow 'en' and 'fr' to be passed to app
-	lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
-	form = course_form(lang)()
-	return render_template('index.html', form=form)
+	# Search bar queries api.search_courses as the user types
+	return render_template('index.html')
 
 
 # Data Explorer's entry for a given course: the meat & potatoes of the app
 @course.route('/course-result')
 @auth.login_required
+@conditional
 def course_result():
 	# Only allow 'en' and 'fr' to be passed to app
 	lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
@@ -46,32 +48,168 @@ def course_result():
 	if not course_code:
 		return render_template('not-found.html')
 	
-	# Instantiate classes
+	# Render a shell holding only the General tab; the other tabs fetch
+	# their contents from course_tab on first activation
+	pass_dict = {'course_code': course_code}
+	pass_dict.update(_load_header(lang, course_code))
+	pass_dict.update(_load_general(lang, course_code))
+	return render_template('/course-page/main.html', pass_dict=pass_dict)
+
+
+# Tabs of the course page loaded on demand: groups of queries each needs and
+# the template that renders it. The Schedule tab is served by course_schedule
+TABS = {
+	'dashboards': (['benchmarks', 'learners', 'offerings'], 'course-page/dashboards/dashboards-main.html'),
+	# Markers are fetched per zoom and viewport from map_clusters
+	'maps': ([], 'course-page/geodata.html'),
+	'comments': (['comments', 'ratings'], 'course-page/comments/comments-main.html')
+}
+
+
+@course.route('/api/v1/course/<string:course_code>/<string:tab>')
+@auth.login_required
+@conditional
+def course_tab(course_code, tab):
+	"""Return the data of one tab of the course page as JSON, or rendered
+	as HTML inside key 'data' if html=true.
+	"""
+	# Only allow 'en' and 'fr' to be passed to app
+	lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
+	course_code = utils.validate_course_code({'course_code': course_code})
+	if not course_code or tab not in TABS:
+		return jsonify({'Error': 'Not Found'}), 404
+	
+	# Each group of queries is independent, so load them concurrently
+	groups, template = TABS[tab]
+	loaders = _loaders(lang, course_code)
+	pass_dict = {'course_code': course_code}
+	pass_dict.update(_load_header(lang, course_code))
+	for results in run_concurrently({group: loaders[group] for group in groups}).values():
+		pass_dict.update(results)
+	
+	# Allow both JSON and a rendered template to be returned
+	html = request.args.get('html', False)
+	if html == 'true':
+		return jsonify(data=render_template(template, pass_dict=pass_dict))
+	else:
+		return jsonify(pass_dict)
+
+
+# Offerings per page of the Schedule tab returned by default and at most
+SCHEDULE_DEFAULT_PER_PAGE = 25
+SCHEDULE_MAX_PER_PAGE = 100
+
+
+@course.route('/api/v1/course/<string:course_code>/schedule')
+@auth.login_required
+@conditional
+def course_schedule(course_code):
+	"""Return a page of this fiscal year's offerings, most recent first, in
+	key 'offerings', with the total number matching in 'total' and the
+	number of the next page in 'next_page' (null on the last page).
+	Optionally only offerings starting from date_1 and / or up to date_2
+	(YYYY-MM-DD), and of status. If html=true, return the rendered
+	Schedule tab, which fetches its offerings from here.
+	"""
+	# Only allow 'en' and 'fr' to be passed to app
+	lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
+	course_code = utils.validate_course_code({'course_code': course_code})
+	if not course_code:
+		return jsonify({'Error': 'Not Found'}), 404
+	
+	try:
+		page = max(int(request.args.get('page', 1)), 1)
+		per_page = int(request.args.get('per_page', SCHEDULE_DEFAULT_PER_PAGE))
+		date_1 = utils.parse_date(request.args.get('date_1', None))
+		date_2 = utils.parse_date(request.args.get('date_2', None))
+	except ValueError:
+		if lang == 'fr':
+			error_message = {'Erreur': 'page et per_page doivent être des entiers, date_1 et date_2 de forme AAAA-MM-JJ.'}
+		else:
+			error_message = {'Error': 'page and per_page must be integers, date_1 and date_2 of form YYYY-MM-DD.'}
+		return jsonify(error_message), 400
+	per_page = max(1, min(per_page, SCHEDULE_MAX_PER_PAGE))
+	
+	status = request.args.get('status', None)
+	results = schedule_queries.offerings_scheduled(lang, THIS_YEAR, course_code, date_1, date_2, status)
+	if request.args.get('html', False) == 'true':
+		pass_dict = {'course_code': course_code, 'offerings_scheduled_count': len(results)}
+		pass_dict.update(_load_header(lang, course_code))
+		return jsonify(data=render_template('course-page/schedule.html', pass_dict=pass_dict))
+	
+	# Only colour the page returned, all relative to the same date; copy
+	# as the offerings are shared with other requests
+	offerings = [dict(dict_) for dict_ in results[(page - 1) * per_page:page * per_page]]
+	schedule_queries.assign_background_colors(offerings, utils.request_today())
+	next_page = page + 1 if page * per_page < len(results) else None
+	return jsonify(offerings=offerings, total=len(results), page=page, per_page=per_page, next_page=next_page)
+
+
+@course.route('/api/v1/course/<string:course_code>/map/<string:kind>')
+@auth.login_required
+@conditional
+def map_clusters(course_code, kind):
+	"""Return the markers of the offerings or learners map for a map at
+	zoom 'zoom' showing bounding box 'bbox' of form 'west,south,east,north'
+	in degrees. Nearby cities are clustered into a single marker of form
+	['city_name', count, latitude, longitude, number_of_cities].
+	"""
+	# Only allow 'en' and 'fr' to be passed to app
+	lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
+	course_code = utils.validate_course_code({'course_code': course_code})
+	if not course_code or kind not in map_queries.KINDS:
+		return jsonify({'Error': 'Not Found'}), 404
+	
+	try:
+		zoom = float(request.args.get('zoom', 0))
+		bbox = request.args.get('bbox', None)
+		if bbox is not None:
+			bbox = tuple(float(coord) for coord in bbox.split(','))
+			if len(bbox) != 4:
+				raise ValueError
+	except ValueError:
+		if lang == 'fr':
+			error_message = {'Erreur': 'zoom doit être un nombre et bbox de forme ouest,sud,est,nord.'}
+		else:
+			error_message = {'Error': 'zoom must be a number and bbox of form west,south,east,north.'}
+		return jsonify(error_message), 400
+	
+	pyramid = map_queries.cluster_pyramid(kind, lang, course_code)
+	return jsonify({'clusters': pyramid.clusters(zoom, bbox)})
+
+
+def _loaders(lang, course_code):
+	"""Map each group of queries to a function loading it. Heaviest first
+	so they start before the per-request concurrency cap is reached.
+	"""
+	return {
+		'benchmarks': _load_benchmarks,
+		'learners': lambda: _load_learners(lang, course_code),
+		'offerings': lambda: _load_offerings(lang, course_code),
+		'ratings': lambda: _load_ratings(course_code),
+		'comments': lambda: _load_comments(lang, course_code)
+	}
+
+
+def _load_header(lang, course_code):
+	"""Title and business type shown on and used by every tab."""
+	registry = get_registry()
+	return {
+		'course_title': registry.title(course_code, lang),
+		'business_type': registry.business_type(course_code)
+	}
+
+
+def _load_general(lang, course_code):
 	course_info = general_queries.CourseInfo(lang, course_code).load()
+	return {'course_info': course_info.course_info}
+
+
+def _load_offerings(lang, course_code):
 	overall_offering_numbers_LY = dashboard_offering_queries.OverallOfferingNumbers(LAST_YEAR, course_code).load()
 	overall_offering_numbers_TY = dashboard_offering_queries.OverallOfferingNumbers(THIS_YEAR, course_code).load()
 	offering_locations = dashboard_offering_queries.OfferingLocations(lang, THIS_YEAR, course_code).load()
-	overall_learner_numbers_LY = dashboard_learner_queries.OverallLearnerNumbers('last_year', course_code).load()
-	overall_learner_numbers_TY = dashboard_learner_queries.OverallLearnerNumbers('this_year', course_code).load()
-	learners_LY = dashboard_learner_queries.Learners(lang, 'last_year', course_code).load()
-	learners_TY = dashboard_learner_queries.Learners(lang, 'this_year', course_code).load()
-	map = map_queries.Map(lang, 'this_year', THIS_YEAR, course_code).load()
-	categorical = comment_queries.Categorical(lang, course_code).load()
-	overall_satisfaction_nanos_LY = rating_queries.OverallSatisfaction(course_code, LAST_YEAR, old_survey=False).load()
-	overall_satisfaction_nanos_TY = rating_queries.OverallSatisfaction(course_code, THIS_YEAR, old_survey=False).load()
-	overall_satisfaction_old_LY = rating_queries.OverallSatisfaction(course_code, LAST_YEAR, old_survey=True).load()
-	overall_satisfaction_old_TY = rating_queries.OverallSatisfaction(course_code, THIS_YEAR, old_survey=True).load()
-	ratings_LY = rating_queries.Ratings(course_code, LAST_YEAR).load()
-	ratings_TY = rating_queries.Ratings(course_code, THIS_YEAR).load()
-	
-	pass_dict = {
-		#Global
-		'course_code': course_code,
-		'course_title': learners_TY.course_title if learners_TY.course_title else learners_LY.course_title,
-		'business_type': learners_TY.business_type if learners_TY.business_type else learners_LY.business_type,
-		# General
-		'course_info': course_info.course_info,
-		# Dashboards - Offerings
+	return {
 		'overall_offering_numbers_LY': overall_offering_numbers_LY.counts,
 		'overall_offering_numbers_TY': overall_offering_numbers_TY.counts,
 		'region_drilldown': offering_locations.regions,
@@ -80,18 +218,33 @@ def course_result():
 		'offerings_per_region_and_quarter': dashboard_offering_queries.offerings_per_region_and_quarter(lang, THIS_YEAR, course_code),
 		'offerings_per_lang_LY': dashboard_offering_queries.offerings_per_lang(LAST_YEAR, course_code),
 		'offerings_per_lang_TY': dashboard_offering_queries.offerings_per_lang(THIS_YEAR, course_code),
-		'offerings_cancelled_global_LY': dashboard_offering_queries.offerings_cancelled_global(LAST_YEAR),
-		'offerings_cancelled_global_TY': dashboard_offering_queries.offerings_cancelled_global(THIS_YEAR),
 		'offerings_cancelled_LY': dashboard_offering_queries.offerings_cancelled(LAST_YEAR, course_code),
 		'offerings_cancelled_TY': dashboard_offering_queries.offerings_cancelled(THIS_YEAR, course_code),
-		'avg_class_size_global_LY': dashboard_offering_queries.avg_class_size_global('last_year'),
-		'avg_class_size_global_TY': dashboard_offering_queries.avg_class_size_global('this_year'),
 		'avg_class_size_LY': dashboard_offering_queries.avg_class_size('last_year', course_code),
 		'avg_class_size_TY': dashboard_offering_queries.avg_class_size('this_year', course_code),
-		'avg_no_shows_global_LY': round(dashboard_offering_queries.avg_no_shows_global('last_year'), 1),
-		'avg_no_shows_global_TY': round(dashboard_offering_queries.avg_no_shows_global('this_year'), 1),
 		'avg_no_shows_LY': round(dashboard_offering_queries.avg_no_shows('last_year', course_code), 1),
-		'avg_no_shows_TY': round(dashboard_offering_queries.avg_no_shows('this_year', course_code), 1),
+		'avg_no_shows_TY': round(dashboard_offering_queries.avg_no_shows('this_year', course_code), 1)
+	}
+
+
+def _load_benchmarks():
+	"""Course-independent figures for all Instructor-Led courses."""
+	return {
+		'offerings_cancelled_global_LY': dashboard_offering_queries.offerings_cancelled_global(LAST_YEAR),
+		'offerings_cancelled_global_TY': dashboard_offering_queries.offerings_cancelled_global(THIS_YEAR),
+		'avg_class_size_global_LY': dashboard_offering_queries.avg_class_size_global('last_year'),
+		'avg_class_size_global_TY': dashboard_offering_queries.avg_class_size_global('this_year'),
+		'avg_no_shows_global_LY': round(dashboard_offering_queries.avg_no_shows_global('last_year'), 1),
+		'avg_no_shows_global_TY': round(dashboard_offering_queries.avg_no_shows_global('this_year'), 1)
+	}
+
+
+def _load_learners(lang, course_code):
+	overall_learner_numbers_LY = dashboard_learner_queries.OverallLearnerNumbers('last_year', course_code).load()
+	overall_learner_numbers_TY = dashboard_learner_queries.OverallLearnerNumbers('this_year', course_code).load()
+	learners_LY = dashboard_learner_queries.Learners(lang, 'last_year', course_code).load()
+	learners_TY = dashboard_learner_queries.Learners(lang, 'this_year', course_code).load()
+	return {
 		# Dashboards - Learners
 		'overall_learner_numbers_LY': overall_learner_numbers_LY.counts,
 		'overall_learner_numbers_TY': overall_learner_numbers_TY.counts,
@@ -102,18 +255,31 @@ def course_result():
 		'top_5_depts_TY': learners_TY.top_depts,
 		'top_5_classifs_TY': learners_TY.top_classifs,
 		'top_5_depts_LY': learners_LY.top_depts,
-		'top_5_classifs_LY': learners_LY.top_classifs,
-		# Maps
-		'offering_city_counts': map.offerings,
-		'learner_city_counts': map.learners,
-		# Comments - Categorical
+		'top_5_classifs_LY': learners_LY.top_classifs
+	}
+
+
+def _load_comments(lang, course_code):
+	categorical = comment_queries.Categorical(lang, course_code).load()
+	return {
 		'expectations': categorical.expectations,
 		'recommend': categorical.recommend,
 		'gccampus': categorical.gccampus,
 		'videos': categorical.videos,
 		'blogs': categorical.blogs,
 		'forums': categorical.forums,
-		'job_aids': categorical.job_aids,
+		'job_aids': categorical.job_aids
+	}
+
+
+def _load_ratings(course_code):
+	overall_satisfaction_nanos_LY = rating_queries.OverallSatisfaction(course_code, LAST_YEAR, old_survey=False).load()
+	overall_satisfaction_nanos_TY = rating_queries.OverallSatisfaction(course_code, THIS_YEAR, old_survey=False).load()
+	overall_satisfaction_old_LY = rating_queries.OverallSatisfaction(course_code, LAST_YEAR, old_survey=True).load()
+	overall_satisfaction_old_TY = rating_queries.OverallSatisfaction(course_code, THIS_YEAR, old_survey=True).load()
+	ratings_LY = rating_queries.Ratings(course_code, LAST_YEAR).load()
+	ratings_TY = rating_queries.Ratings(course_code, THIS_YEAR).load()
+	return {
 		# Comments - Overall Satisfaction
 		'overall_satisfaction_nanos_LY': overall_satisfaction_nanos_LY.processed,
 		'overall_satisfaction_nanos_TY': overall_satisfaction_nanos_TY.processed,
@@ -121,8 +287,5 @@ def course_result():
 		'overall_satisfaction_old_TY': overall_satisfaction_old_TY.processed,
 		# Comments - Ratings
 		'ratings_LY': ratings_LY.processed,
-		'ratings_TY': ratings_TY.processed,
-		# Schedule
-		'offerings_scheduled': schedule_queries.offerings_scheduled(lang, THIS_YEAR, course_code)
+		'ratings_TY': ratings_TY.processed
 	}
-	return render_template('/course-page/main.html', pass_dict=pass_dict)
@@ -0,0 +1,158 @@
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+# Length of the n-grams used for substring matching
+NGRAM_LENGTH = 3
+
+_non_alnum = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+	"""Lower-case, strip accents, and collapse punctuation to single spaces
+	e.g. 'Évaluation (G123)' -> 'evaluation g123'.
+	"""
+	text = unicodedata.normalize('NFKD', str(text))
+	text = ''.join(char for char in text if not unicodedata.combining(char))
+	return _non_alnum.sub(' ', text.casefold()).strip()
+
+
+def _ngrams(token):
+	return {token[i:i + NGRAM_LENGTH] for i in range(len(token) - NGRAM_LENGTH + 1)}
+
+
+class SearchIndex:
+	"""Typeahead index over course codes and EN/FR titles.
+	
+	Query words shorter than NGRAM_LENGTH are matched as word prefixes via
+	the sorted vocabulary searched with bisect; longer
+	ones as substrings of indexed words via an n-gram index over the
+	vocabulary, so that candidates are verified once per distinct word
+	rather than once per course. Every query word must match. Matches are ranked in
+	tiers: exact code, code prefix, title prefix, every word starting a
+	word of the title, the same in any field, and other substrings. Within
+	a tier, shorter titles come first. Tiers are built from the sorted
+	lists rather than by scoring each candidate so that broad queries stay
+	cheap.
+	"""
+	def __init__(self, titles):
+		"""titles: dict mapping course_code to {'en': title, 'fr': title}."""
+		self.titles = titles
+		self.langs = sorted({lang for course_titles in titles.values() for lang in course_titles})
+		# Normalized code and titles per course
+		self._texts = {}
+		# Courses per distinct word, overall and per field ('code' or lang),
+		# and distinct words per n-gram
+		self._word_courses = defaultdict(set)
+		self._field_word_courses = defaultdict(lambda: defaultdict(set))
+		self._ngram_index = defaultdict(set)
+		for course_code, course_titles in titles.items():
+			texts = {'code': normalize(course_code)}
+			texts.update({lang: normalize(title) for (lang, title) in course_titles.items()})
+			self._texts[course_code] = texts
+			for field, text in texts.items():
+				for word in text.split():
+					self._word_courses[word].add(course_code)
+					self._field_word_courses[field][word].add(course_code)
+		for word in self._word_courses:
+			for ngram in _ngrams(word):
+				self._ngram_index[ngram].add(word)
+		self._vocabulary = sorted(self._word_courses)
+		# Sorted normalized codes and titles for whole-query prefix matches
+		self._codes = sorted((texts['code'], course_code) for (course_code, texts) in self._texts.items())
+		self._code_keys = [tup[0] for tup in self._codes]
+		self._sorted_titles = {}
+		self._title_keys = {}
+		# Position of each course when ordered by title length, then code
+		self._order = {}
+		for lang in self.langs:
+			self._sorted_titles[lang] = sorted((texts.get(lang, ''), course_code) for (course_code, texts) in self._texts.items())
+			self._title_keys[lang] = [tup[0] for tup in self._sorted_titles[lang]]
+			ordered = sorted(self._texts, key=lambda course_code: (len(self._texts[course_code].get(lang, '')), course_code))
+			self._order[lang] = {course_code: i for (i, course_code) in enumerate(ordered)}
+	
+	
+	def search(self, query, lang, limit):
+		"""Return up to limit best matches for query as dicts with keys
+		course_code and course_title, the latter in lang.
+		"""
+		query = normalize(query)
+		query_words = query.split()
+		if not query_words or limit < 1 or lang not in self._order:
+			return []
+		candidates = None
+		# Courses where every query word starts a word of the title in lang, or of any field
+		lang_prefixed = None
+		any_prefixed = None
+		lang_word_courses = self._field_word_courses[lang]
+		for word in query_words:
+			prefix_words = self._prefix_words(word)
+			prefixed = set().union(*(self._word_courses[prefix_word] for prefix_word in prefix_words))
+			matches = prefixed if len(word) < NGRAM_LENGTH else self._substring_matches(word)
+			candidates = matches if candidates is None else candidates & matches
+			if not candidates:
+				return []
+			lang_matches = set().union(*(lang_word_courses[prefix_word] for prefix_word in prefix_words
+										 if prefix_word in lang_word_courses))
+			lang_prefixed = lang_matches if lang_prefixed is None else lang_prefixed & lang_matches
+			any_prefixed = prefixed if any_prefixed is None else any_prefixed & prefixed
+		tiers = [
+			_range(self._codes, self._code_keys, query, exact=True),
+			_range(self._codes, self._code_keys, query),
+			_range(self._sorted_titles[lang], self._title_keys[lang], query),
+			lang_prefixed,
+			any_prefixed,
+			candidates
+		]
+		# Fill results tier by tier, taking the shortest titles from each
+		results = []
+		seen = set()
+		order = self._order[lang]
+		for tier in tiers:
+			tier = (tier & candidates) - seen
+			needed = limit - len(results)
+			if len(tier) > needed:
+				tier = heapq.nsmallest(needed, tier, key=order.__getitem__)
+			else:
+				tier = sorted(tier, key=order.__getitem__)
+			results.extend(tier)
+			seen.update(tier)
+			if len(results) >= limit:
+				break
+		return [{'course_code': course_code, 'course_title': self._title(course_code, lang)} for course_code in results]
+	
+	
+	def _prefix_words(self, word):
+		"""Indexed words starting with word."""
+		start = bisect_left(self._vocabulary, word)
+		end = bisect_left(self._vocabulary, word + '\uffff', lo=start)
+		return self._vocabulary[start:end]
+	
+	
+	def _substring_matches(self, word):
+		"""Courses having a word containing word in their code or titles."""
+		ngram_sets = [self._ngram_index.get(ngram) for ngram in _ngrams(word)]
+		if not all(ngram_sets):
+			return set()
+		# Start from the rarest n-gram to keep intersections small
+		ngram_sets.sort(key=len)
+		indexed_words = ngram_sets[0].intersection(*ngram_sets[1:])
+		# N-grams may sit apart within a word; confirm the substring itself
+		return set().union(*(self._word_courses[indexed_word] for indexed_word in indexed_words if word in indexed_word))
+	
+	
+	def _title(self, course_code, lang):
+		"""Title in lang, falling back on the other language if missing."""
+		titles = self.titles[course_code]
+		return titles.get(lang) or next((title for title in titles.values() if title), '')
+
+
+def _range(sorted_pairs, keys, prefix, exact=False):
+	"""Course codes of pairs (text, course_code) whose text equals, or
+	starts with, prefix.
+	"""
+	start = bisect_left(keys, prefix)
+	end = bisect_left(keys, prefix + ('\x00' if exact else '\uffff'), lo=start)
+	return {tup[1] for tup in sorted_pairs[start:end]}
@@ -1,29 +1,14 @@
-from data_explorer.db import query_mysql
+import datetime
+from flask import current_app
+from data_explorer.concurrency import get_memo
+from data_explorer.course_routes.registry import get_registry
 
 
 def validate_course_code(args):
 	"""Check if course code exists in LSR."""
 	course_code = str(args.get('course_code', False)).upper()
-	# Check if found in DB; automatically escaped in MySQL via %s
-	query = """
-		SELECT
-			EXISTS (
-				SELECT course_code
-				FROM lsr_last_year
-				WHERE course_code = %s
-				LIMIT 1
-			)
-		OR
-			EXISTS (
-				SELECT course_code
-				FROM lsr_this_year
-				WHERE course_code = %s
-				LIMIT 1
-			);
-	"""
-	course_check = query_mysql(query, (course_code, course_code))
-	course_check = as_string(course_check)
-	return course_code if course_check else False
+	# Answered from memory by the course registry
+	return course_code if course_code in get_registry() else False
 
 
 def as_string(my_val, error_msg=False):
@@ -55,3 +40,35 @@ def as_percent(my_val):
 	MySQL. Convert from [(my_val,)] to percentage.
 	"""
 	return round(as_float(my_val), 2) * 100
+
+
+def request_memo(key, factory):
+	"""Cache the result of factory() for the request so that data shared by
+	several query classes is only loaded once, even across loader threads.
+	"""
+	return get_memo().get(key, factory)
+
+
+def parse_date(date_string):
+	"""Parse a date of form YYYY-MM-DD, in which month and day may lack
+	leading zeros, or return None if empty. Raises ValueError if invalid.
+	"""
+	if not date_string:
+		return None
+	return datetime.datetime.strptime(date_string, '%Y-%m-%d').date()
+
+
+def request_today():
+	"""Today's date, fixed for the request, against which offerings are
+	classified as past, upcoming, or at risk.
+	"""
+	return request_memo('today', datetime.date.today)
+
+
+def use_pandas(rows):
+	"""Check if rows are numerous enough to be worth processing with pandas;
+	smaller results are processed in plain Python, where building a
+	DataFrame would cost more than the work itself. See config
+	PANDAS_ROW_THRESHOLD.
+	"""
+	return len(rows) > current_app.config['PANDAS_ROW_THRESHOLD']
@@ -1,37 +1,209 @@
 import os
+import queue
+import threading
+import time
 from flask import g
 import mysql.connector
+from data_explorer import instrumentation
 
 
 def query_mysql(query, args=None, dict_=False):
-	"""Run query on connection stored in g."""
+	"""Run query on connection stored in g and record its timing."""
 	cnx = get_db()
+	start = time.perf_counter()
 	cursor = cnx.cursor(dictionary=dict_)
 	cursor.execute(query, args)
 	results = cursor.fetchall()
 	cursor.close()
+	duration_ms = (time.perf_counter() - start) * 1000
+	instrumentation.record_query(instrumentation.caller_tag(), query, duration_ms, len(results))
 	return results
 
 
+def iter_mysql(query, args=None, chunk_size=1000):
+	"""Run query on connection stored in g and yield tuples (columns, rows)
+	with up to chunk_size rows at a time, so that large results never sit
+	in memory in full. columns is the cursor's description i.e. a tuple
+	(name, type_code, ...) per column. Only time spent in MySQL is recorded.
+	"""
+	# Tag now, as the generator may be advanced and finished from anywhere
+	return _iter_chunks(query, args, chunk_size, instrumentation.caller_tag())
+
+
+def _iter_chunks(query, args, chunk_size, tag):
+	cnx = get_db()
+	start = time.perf_counter()
+	# Unbuffered so that rows are read off the socket as they're fetched
+	cursor = cnx.cursor(buffered=False)
+	cursor.execute(query, args)
+	duration = time.perf_counter() - start
+	row_count = 0
+	try:
+		while True:
+			start = time.perf_counter()
+			rows = cursor.fetchmany(chunk_size)
+			duration += time.perf_counter() - start
+			if not rows:
+				break
+			row_count += len(rows)
+			yield cursor.description, rows
+	finally:
+		# Drain rows left unread if the consumer stopped early, else the
+		# connection can't be reused
+		if cnx.unread_result:
+			cnx.consume_results()
+		cursor.close()
+		instrumentation.record_query(tag, query, duration * 1000, row_count)
+
+
 def get_db():
-	"""Connect to DB and store connection in g for life of request."""
+	"""Check out a pooled connection and store it in g for life of request."""
 	if 'db' not in g:
-		g.db = mysql.connector.connect(host=os.environ.get('DB_HOST'),
-									   user=os.environ.get('DB_USER'),
-									   password=os.environ.get('DB_PASSWORD'),
-									   database=os.environ.get('DB_DATABASE_NAME'))
+		g.db = _get_pool().get()
 	return g.db
 
 
 def close_db(e=None):
-	"""Remove connection to db from g and close."""
+	"""Remove connection to db from g and return it to the pool."""
 	db = g.pop('db', None)
 	if db is not None:
-		db.close()
+		_get_pool().put(db)
+
+
+class PoolExhaustedError(Exception):
+	"""Raised when no connection could be checked out before the timeout."""
+	pass
+
+
+class ConnectionPool:
+	"""Process-wide pool of MySQL connections.
+	
+	Connections are recycled once older than max_lifetime seconds and pinged
+	on checkout so that a connection dropped by the server (e.g. after
+	wait_timeout) is replaced rather than handed to a query. The pool records
+	the PID that created it; a forked child discards the inherited connections
+	without closing them, as closing would send COM_QUIT down a socket still
+	used by the parent.
+	"""
+	def __init__(self, size, max_lifetime, timeout, **connect_kwargs):
+		self.size = size
+		self.max_lifetime = max_lifetime
+		self.timeout = timeout
+		self.connect_kwargs = connect_kwargs
+		self._lock = threading.Lock()
+		self._reset()
+	
+	
+	def _reset(self):
+		"""Forget all connections; called on init and after a fork."""
+		self._pid = os.getpid()
+		# LIFO so that the most recently used (i.e. warmest) connection is reused first
+		self._idle = queue.LifoQueue()
+		self._created_at = {}
+		self._slots = threading.BoundedSemaphore(self.size)
+	
+	
+	def _check_pid(self):
+		if self._pid != os.getpid():
+			with self._lock:
+				if self._pid != os.getpid():
+					self._reset()
+	
+	
+	def get(self):
+		"""Check out a healthy connection, opening a new one if necessary."""
+		self._check_pid()
+		if not self._slots.acquire(timeout=self.timeout):
+			raise PoolExhaustedError('No DB connection available after {0}s.'.format(self.timeout))
+		try:
+			while True:
+				try:
+					cnx = self._idle.get_nowait()
+				except queue.Empty:
+					return self._connect()
+				if self._is_healthy(cnx):
+					return cnx
+				self._discard(cnx)
+		except Exception:
+			self._slots.release()
+			raise
+	
+	
+	def put(self, cnx):
+		"""Return a connection to the pool."""
+		# Connection was inherited from parent process; slot belongs to old pool
+		if id(cnx) not in self._created_at:
+			return
+		if self._expired(cnx):
+			self._discard(cnx)
+		else:
+			self._idle.put(cnx)
+		self._slots.release()
+	
+	
+	def _connect(self):
+		cnx = mysql.connector.connect(**self.connect_kwargs)
+		self._created_at[id(cnx)] = time.monotonic()
+		return cnx
+	
+	
+	def _expired(self, cnx):
+		age = time.monotonic() - self._created_at.get(id(cnx), 0)
+		return age > self.max_lifetime
+	
+	
+	def _is_healthy(self, cnx):
+		if self._expired(cnx):
+			return False
+		try:
+			cnx.ping(reconnect=False)
+		except mysql.connector.Error:
+			return False
+		return True
+	
+	
+	def _discard(self, cnx):
+		self._created_at.pop(id(cnx), None)
+		try:
+			cnx.close()
+		except mysql.connector.Error:
+			pass
+
+
+_pool = None
+_fork_hook_registered = False
+
+
+def _get_pool():
+	if _pool is None:
+		raise RuntimeError('DB pool not initialised; call db.init_app first.')
+	return _pool
+
+
+def _reset_after_fork():
+	if _pool is not None:
+		_pool._reset()
 
 
 def init_app(app):
-	"""In factory function, register the close_db function so
-	that connections closed at end of request.
+	"""In factory function, create the process-wide connection pool and
+	register the close_db function so that connections are returned to
+	the pool at end of request.
 	"""
+	global _pool, _fork_hook_registered
+	_pool = ConnectionPool(size=app.config['DB_POOL_SIZE'],
+						   max_lifetime=app.config['DB_POOL_MAX_LIFETIME'],
+						   timeout=app.config['DB_POOL_TIMEOUT'],
+						   host=os.environ.get('DB_HOST'),
+						   user=os.environ.get('DB_USER'),
+						   password=os.environ.get('DB_PASSWORD'),
+						   database=os.environ.get('DB_DATABASE_NAME'),
+						   # Read-only app; autocommit prevents a reused connection
+						   # from holding a stale REPEATABLE READ snapshot
+						   autocommit=True)
+	# Pre-forking WSGI servers (e.g. mod_wsgi daemon mode) fork after import;
+	# drop inherited connections eagerly in the child
+	if hasattr(os, 'register_at_fork') and not _fork_hook_registered:
+		os.register_at_fork(after_in_child=_reset_after_fork)
+		_fork_hook_registered = True
 	app.teardown_appcontext(close_db)
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from flask_babel import lazy_gettext
+from data_explorer.cache import data_version
+from data_explorer.download_routes import writers
+from data_explorer.download_routes.queries import download_queries
+
+log = logging.getLogger(__name__)
+
+# Exportable tabs: query function, its formats, whether it takes a course
+# code (else a sheet name), and the name of the downloaded file
+TABS = {
+	'browse': (download_queries.browse_tab, writers.FORMATS, False, lazy_gettext('Browse Tab')),
+	'calendar': (download_queries.calendar_tab, writers.FORMATS, False, lazy_gettext('National Ops')),
+	'general': (download_queries.general_tab, writers.FORMATS, True, lazy_gettext('General Tab')),
+	'comments': (download_queries.comments_tab, writers.FORMATS, True, lazy_gettext('Comments Tab')),
+	'ratings': (download_queries.ratings_tab, writers.FORMATS, True, lazy_gettext('Ratings Tab')),
+	'schedule': (download_queries.schedule_tab, writers.FORMATS, True, lazy_gettext('Schedule Tab')),
+	'course': (download_queries.course_tabs, writers.COURSE_FORMATS, True, None)
+}
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_job_id_format = re.compile(r'^[0-9a-f]{20}$')
+
+
+def job_id(tab, course_code, fmt, lang, version):
+	"""Identify the export of tab for course_code in format fmt and
+	language lang (which sets sheet names and messages) as of data-load
+	version. Identical requests therefore share a job and its file.
+	"""
+	key = json.dumps([tab, course_code, fmt, lang, version])
+	return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+
+def submit(tab, course_code, fmt, lang):
+	"""Return the status of the job exporting tab, creating and queueing it
+	unless an identical job is already queued, running, or done.
+	"""
+	version = data_version()
+	id_ = job_id(tab, course_code, fmt, lang, version)
+	status = read_status(id_)
+	if status is not None and not _needs_rerun(status):
+		return status
+	_purge_once(version)
+	now = time.time()
+	new_status = {
+		'job_id': id_,
+		'tab': tab,
+		'course_code': course_code,
+		'format': fmt,
+		'lang': lang,
+		'version': version,
+		'status': QUEUED,
+		'attempt': status.get('attempt', 0) + 1 if status is not None else 0,
+		'rows_written': 0,
+		'created_at': now,
+		'updated_at': now,
+		'finished_at': None
+	}
+	# Only one thread or process may create the job, or retry a failed or
+	# abandoned one, the others returning the winner's status
+	claimed = _claim_retry(new_status) if status is not None else _create_status(new_status)
+	if not claimed:
+		return read_status(id_) or new_status
+	# Pass the app rather than a copy of the request, which would outlive it
+	app = current_app._get_current_object()
+	_get_executor().submit(_run_in_app, app, new_status)
+	return new_status
+
+
+def read_status(id_):
+	"""Return the status dict of job id_, or None if unknown."""
+	if not _job_id_format.match(id_):
+		return None
+	try:
+		with open(_status_path(id_), encoding='utf-8') as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
+
+
+def open_file(status):
+	"""Open the finished file of a job for reading."""
+	return open(_file_path(status), 'rb')
+
+
+def filename(status):
+	"""Name, without extension, under which a job's file is downloaded."""
+	name = TABS[status['tab']][3]
+	return str(name) if name is not None else status['course_code']
+
+
+def formats(tab):
+	"""Formats in which tab can be exported."""
+	return TABS[tab][1]
+
+
+def _run_in_app(app, status):
+	"""Run the job in an app context of the worker's own, holding its
+	pooled connection. Sheet names and messages are translated via a bare
+	request carrying only the job's language cookie.
+	"""
+	cookie = 'lang={0}'.format(status['lang'])
+	with app.app_context(), app.test_request_context(environ_base={'HTTP_COOKIE': cookie}):
+		_run(status)
+
+
+def _run(status):
+	"""Write the job's file to a temporary name in the export directory,
+	updating rows_written after each chunk, then move it into place.
+	"""
+	query_func, _, takes_course_code, name = TABS[status['tab']]
+	status.update(status=RUNNING, updated_at=time.time())
+	_write_status(status)
+	
+	def progress(rows):
+		status['rows_written'] += rows
+		status['updated_at'] = time.time()
+		_write_status(status)
+	
+	arg = status['course_code'] if takes_course_code else str(name)
+	path = _file_path(status)
+	partial_path = '{0}.{1}.part'.format(path, os.getpid())
+	try:
+		with query_func(arg, status['format'], progress) as file:
+			with open(partial_path, 'wb') as out:
+				shutil.copyfileobj(file, out)
+		os.replace(partial_path, path)
+		status.update(status=DONE, finished_at=time.time())
+	except Exception:
+		log.exception('Export job %s failed', status['job_id'])
+		_remove(partial_path)
+		status.update(status=FAILED, finished_at=time.time())
+	status['updated_at'] = time.time()
+	_write_status(status)
+
+
+def _needs_rerun(status):
+	"""Check if a job failed, or if its process appears to have died,
+	having not reported progress for EXPORT_JOB_TIMEOUT seconds.
+	"""
+	if status['status'] == FAILED:
+		return True
+	if status['status'] == DONE:
+		return not os.path.exists(_file_path(status))
+	return time.time() - status['updated_at'] > current_app.config['EXPORT_JOB_TIMEOUT']
+
+
+# Data-load version whose finished jobs this process last purged the others of
+_purged_version = None
+_purge_lock = threading.Lock()
+
+
+def _purge_once(version):
+	"""Purge jobs of other data loads the first time this process sees
+	version, rather than on every submit.
+	"""
+	global _purged_version
+	with _purge_lock:
+		if _purged_version == version:
+			return
+		_purged_version = version
+	_purge(version)
+
+
+def _purge(version):
+	"""Delete finished jobs, their files, and their retry claims from data
+	loads other than version.
+	"""
+	entries = os.listdir(_export_dir())
+	for entry in entries:
+		if not entry.endswith('.json'):
+			continue
+		status = read_status(entry[:-len('.json')])
+		if status is None or status['version'] == version or status['status'] not in (DONE, FAILED):
+			continue
+		_remove(_file_path(status))
+		_remove(_status_path(status['job_id']))
+		for claim in entries:
+			if claim.startswith(status['job_id'] + '.') and claim.endswith('.claim'):
+				_remove(os.path.join(_export_dir(), claim))
+
+
+def _create_status(status):
+	"""Write status only if the job has no status file yet. Returns False
+	if another thread or process got there first.
+	"""
+	temp_path = _write_temp(status)
+	try:
+		# Unlike os.replace, fails if the target exists
+		os.link(temp_path, _status_path(status['job_id']))
+		return True
+	except FileExistsError:
+		return False
+	finally:
+		_remove(temp_path)
+
+
+def _claim_retry(status):
+	"""Claim the retry of a failed or abandoned job by creating a file
+	named after its attempt number, then replace its status. Returns False
+	if another thread or process claimed that attempt first.
+	"""
+	temp_path = _write_temp(status)
+	claim_path = os.path.join(_export_dir(), '{0}.{1}.claim'.format(status['job_id'], status['attempt']))
+	try:
+		os.link(temp_path, claim_path)
+	except FileExistsError:
+		return False
+	finally:
+		_remove(temp_path)
+	_write_status(status)
+	return True
+
+
+def _write_status(status):
+	"""Atomically replace the job's status file so that other processes
+	never read a partial one.
+	"""
+	os.replace(_write_temp(status), _status_path(status['job_id']))
+
+
+def _write_temp(status):
+	fd, temp_path = tempfile.mkstemp(dir=_export_dir(), suffix='.tmp')
+	with os.fdopen(fd, 'w', encoding='utf-8') as f:
+		json.dump(status, f)
+	return temp_path
+
+
+def _remove(path):
+	try:
+		os.remove(path)
+	except FileNotFoundError:
+		pass
+
+
+def _export_dir():
+	"""Return the directory shared by every process for job statuses and
+	files, creating it if needed.
+	"""
+	path = current_app.config['EXPORT_DIR']
+	os.makedirs(path, exist_ok=True)
+	return path
+
+
+def _status_path(id_):
+	return os.path.join(_export_dir(), '{0}.json'.format(id_))
+
+
+def _file_path(status):
+	extension = formats(status['tab'])[status['format']][2]
+	return os.path.join(_export_dir(), '{0}.{1}'.format(status['job_id'], extension))
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+	"""Return the process-wide export pool; recreated after a fork as
+	worker threads don't survive into the child.
+	"""
+	global _executor, _executor_pid
+	with _executor_lock:
+		if _executor is None or _executor_pid != os.getpid():
+			_executor = ThreadPoolExecutor(max_workers=current_app.config['EXPORT_WORKERS'],
+										   thread_name_prefix='data-explorer-export')
+			_executor_pid = os.getpid()
+		return _executor
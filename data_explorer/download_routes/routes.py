@@ -1,29 +1,42 @@
 import datetime
-from flask import Blueprint, make_response, request
+import os
+from flask import Blueprint, Response, render_template, request, url_for
+from werkzeug.wsgi import wrap_file
 from flask_babel import gettext
 from data_explorer import auth
 from data_explorer.course_routes import utils
+from data_explorer.download_routes import jobs, writers
 from data_explorer.download_routes.queries import download_queries
+from data_explorer.serialization import jsonify
 
 # Instantiate blueprint
 downloads = Blueprint('downloads', __name__)
 
+# Bytes of a file sent to the browser at a time
+STREAM_BUFFER_SIZE = 64 * 1024
+
 
 @downloads.route('/download-browse')
 @auth.login_required
 def download_browse():
+	fmt, error = _get_format(request)
+	if error:
+		return error, 400
 	filename = gettext('Browse Tab')
-	raw_data = download_queries.browse_tab(filename)
-	response = _create_file(raw_data, filename)
+	raw_data = download_queries.browse_tab(filename, fmt)
+	response = _create_file(raw_data, filename, fmt)
 	return response
 
 
 @downloads.route('/download-calendar')
 @auth.login_required
 def download_calendar():
+	fmt, error = _get_format(request)
+	if error:
+		return error, 400
 	filename = gettext('National Ops')
-	raw_data = download_queries.calendar_tab(filename)
-	response = _create_file(raw_data, filename)
+	raw_data = download_queries.calendar_tab(filename, fmt)
+	response = _create_file(raw_data, filename, fmt)
 	return response
 
 
@@ -63,32 +76,133 @@ def download_schedule():
 	return response
 
 
+@downloads.route('/download-course')
+@auth.login_required
+def download_course():
+	"""General, Comments, Ratings, and Schedule tabs in one file: a
+	workbook with a sheet per tab, or a zip of CSVs if format=csv.
+	"""
+	fmt = request.args.get('format', 'xlsx').lower()
+	if fmt not in writers.COURSE_FORMATS:
+		return gettext('Unsupported format.'), 400
+	course_code = utils.validate_course_code(request.args)
+	if not course_code:
+		return render_template('not-found.html'), 404
+	raw_data = download_queries.course_tabs(course_code, fmt)
+	response = _create_file(raw_data, course_code, fmt, writers.COURSE_FORMATS)
+	return response
+
+
+@downloads.route('/api/v1/exports', methods=['POST'])
+@auth.login_required
+def create_export():
+	"""Queue the export of a tab, given by args tab, course_code (except
+	for tabs browse and calendar), and format, to run in the background.
+	Returns the job's status with code 202, or 200 if an identical export
+	is already on disk.
+	"""
+	lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
+	tab = request.values.get('tab', '')
+	if tab not in jobs.TABS:
+		return _json_error(lang, 'Unknown tab.', 'Onglet inconnu.', 400)
+	fmt = request.values.get('format', 'xlsx').lower()
+	if fmt not in jobs.formats(tab):
+		return _json_error(lang, 'Unsupported format.', 'Format non pris en charge.', 400)
+	if fmt == 'parquet' and not writers.parquet_available():
+		return _json_error(lang, 'Parquet downloads are not available on this server.',
+						   'Les téléchargements Parquet ne sont pas disponibles sur ce serveur.', 400)
+	course_code = None
+	if jobs.TABS[tab][2]:
+		course_code = utils.validate_course_code(request.values)
+		if not course_code:
+			return _json_error(lang, 'Course not found.', 'Cours introuvable.', 404)
+	status = jobs.submit(tab, course_code, fmt, lang)
+	return jsonify(_export_status(status)), 200 if status['status'] == jobs.DONE else 202
+
+
+@downloads.route('/api/v1/exports/<job_id>')
+@auth.login_required
+def export_status(job_id):
+	"""Status of an export job, including rows written so far."""
+	status = jobs.read_status(job_id)
+	if status is None:
+		lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
+		return _json_error(lang, 'Export not found.', 'Exportation introuvable.', 404)
+	return jsonify(_export_status(status))
+
+
+@downloads.route('/api/v1/exports/<job_id>/file')
+@auth.login_required
+def export_file(job_id):
+	"""Download the file of a finished export job."""
+	lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
+	status = jobs.read_status(job_id)
+	if status is None:
+		return _json_error(lang, 'Export not found.', 'Exportation introuvable.', 404)
+	if status['status'] != jobs.DONE:
+		return _json_error(lang, 'Export not finished.', 'Exportation non terminée.', 409)
+	try:
+		raw_data = jobs.open_file(status)
+	except FileNotFoundError:
+		# Purged after a new data load
+		return _json_error(lang, 'Export not found.', 'Exportation introuvable.', 404)
+	response = _create_file(raw_data, jobs.filename(status), status['format'], jobs.formats(status['tab']))
+	return response
+
+
+def _export_status(status):
+	"""Public fields of a job's status, with links to poll and download it."""
+	results = {key: status[key] for key in ('job_id', 'tab', 'course_code', 'format', 'status', 'rows_written')}
+	results['status_url'] = url_for('downloads.export_status', job_id=status['job_id'])
+	results['download_url'] = url_for('downloads.export_file', job_id=status['job_id']) if status['status'] == jobs.DONE else None
+	return results
+
+
+def _json_error(lang, message_en, message_fr, code):
+	error_message = {'Erreur': message_fr} if lang == 'fr' else {'Error': message_en}
+	return jsonify(error_message), code
+
+
 def _create_response(request, query_func, filename):
 	"""Validate args and create file."""
 	# Validate user input
+	fmt, error = _get_format(request)
+	if error:
+		return error, 400
+	# Rather than a file holding an error message
 	course_code = utils.validate_course_code(request.args)
+	if not course_code:
+		return render_template('not-found.html'), 404
 	# Run query and build file
-	raw_data = _run_query(query_func, course_code)
-	response = _create_file(raw_data, filename)
+	raw_data = query_func(course_code, fmt)
+	response = _create_file(raw_data, filename, fmt)
 	return response
 
 
-def _run_query(query_func, course_code):
-	"""If course code successfully validated, query its raw
-	data, else return error message.
+def _get_format(request):
+	"""Return tuple (format, error message) for arg 'format', which
+	defaults to xlsx.
 	"""
-	if course_code:
-		raw_data = query_func(course_code)
-	else:
-		raw_data = gettext('Course Not Found')
-	return raw_data
-
-
-def _create_file(raw_data, filename):
-	"""Create file for download by browser."""
-	output = make_response(raw_data)
+	fmt = request.args.get('format', 'xlsx').lower()
+	if fmt not in writers.FORMATS:
+		return None, gettext('Unsupported format.')
+	# Parquet depends on optional pyarrow
+	if fmt == 'parquet' and not writers.parquet_available():
+		return None, gettext('Parquet downloads are not available on this server.')
+	return fmt, None
+
+
+def _create_file(raw_data, filename, fmt, formats=writers.FORMATS):
+	"""Create file for download by browser. raw_data is an open file in
+	format fmt, streamed in chunks and closed (and, if temporary, deleted)
+	once sent.
+	"""
+	size = os.fstat(raw_data.fileno()).st_size
+	output = Response(wrap_file(request.environ, raw_data, buffer_size=STREAM_BUFFER_SIZE), direct_passthrough=True)
+	output.headers['Content-Length'] = size
 	timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 	# 'attachment' to ensure downloads rather than opened in browser
-	output.headers['Content-Disposition'] = 'attachment; filename="{0} {1}.xlsx"'.format(filename, timestamp)
-	output.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+	content_type, extension = formats[fmt][1:]
+	output.headers['Content-Disposition'] = 'attachment; filename="{0} {1}.{2}"'.format(filename, timestamp, extension)
+	output.headers['Content-Type'] = content_type
 	return output
@@ -0,0 +1,181 @@
+import csv
+import io
+import zipfile
+from mysql.connector import FieldType
+from data_explorer import serialization
+
+# Suffixes of columns holding the same text in English and French
+BILINGUAL_SUFFIXES = ('_en', '_fr')
+
+
+def write_xlsx(file, chunks, sheet_name, no_data_message):
+	"""Write chunks to file as a single-sheet workbook."""
+	write_xlsx_sheets(file, [(sheet_name, chunks)], no_data_message)
+
+
+def write_xlsx_sheets(file, sheets, no_data_message):
+	"""Write a list of tuples (sheet_name, chunks) to file as a workbook.
+	
+	The workbook is written in xlsxwriter's constant_memory mode, which
+	flushes each row to disk once the next begins, so memory use doesn't
+	grow with the size of the table. Rows must therefore be written in
+	order, and sheets one after the other.
+	"""
+	# Imported on first use to keep worker startup fast
+	import xlsxwriter
+	workbook = xlsxwriter.Workbook(file, {
+		'constant_memory': True,
+		'default_date_format': 'YYYY-MM-DD',
+		# Write free text as-is e.g. comments starting with '=' or holding URLs
+		'strings_to_formulas': False,
+		'strings_to_urls': False
+	})
+	# Same header style as pandas.DataFrame.to_excel
+	header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+	for sheet_name, chunks in sheets:
+		worksheet = workbook.add_worksheet(sheet_name)
+		row_num = 0
+		for columns, rows in chunks:
+			if row_num == 0:
+				worksheet.write_row(0, 0, _column_names(columns), header_format)
+				row_num = 1
+			for row in rows:
+				worksheet.write_row(row_num, 0, row)
+				row_num += 1
+		# Account for tabs without data e.g. no learners have filled out a survey
+		if row_num == 0:
+			worksheet.write(0, 0, no_data_message, header_format)
+	workbook.close()
+
+
+def write_csv(file, chunks, sheet_name, no_data_message):
+	"""Write chunks to file as UTF-8 CSV with a header row. Dates are
+	written as YYYY-MM-DD and NULLs as empty fields.
+	"""
+	# Wrap the binary file without taking ownership of it
+	text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+	writer = csv.writer(text)
+	header_written = False
+	for columns, rows in chunks:
+		if not header_written:
+			writer.writerow(_column_names(columns))
+			header_written = True
+		writer.writerows(rows)
+	if not header_written:
+		writer.writerow([no_data_message])
+	text.flush()
+	text.detach()
+
+
+def write_csv_zip(file, sheets, no_data_message):
+	"""Write a list of tuples (sheet_name, chunks) to file as a zip holding
+	one CSV per sheet, named after it.
+	"""
+	with zipfile.ZipFile(file, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+		for sheet_name, chunks in sheets:
+			with zip_file.open('{0}.csv'.format(sheet_name), 'w') as entry:
+				write_csv(entry, chunks, sheet_name, no_data_message)
+
+
+def write_ndjson(file, chunks, sheet_name, no_data_message):
+	"""Write chunks to file as newline-delimited JSON, one object per row.
+	Writes nothing if there are no rows.
+	"""
+	for columns, rows in chunks:
+		column_names = _column_names(columns)
+		lines = [serialization.dumps_bytes(dict(zip(column_names, row))) for row in rows]
+		file.write(b'\n'.join(lines) + b'\n')
+
+
+def write_parquet(file, chunks, sheet_name, no_data_message):
+	"""Write chunks to file as Parquet, one row group per chunk.
+	
+	Column types are taken from MySQL's field types rather than inferred
+	from values, so that every chunk has the same schema even if a column
+	is entirely NULL in some. Bilingual text columns (suffixed _en or _fr)
+	are dictionary-encoded so that readers load them as categoricals.
+	Requires pyarrow.
+	"""
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+	writer = None
+	try:
+		for columns, rows in chunks:
+			if writer is None:
+				schema = _arrow_schema(pa, columns)
+				writer = pq.ParquetWriter(file, schema)
+			arrays = [_arrow_array(pa, values, field) for (values, field) in zip(zip(*rows), schema)]
+			writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+		# Account for tabs without data
+		if writer is None:
+			schema = pa.schema([(no_data_message, pa.string())])
+			writer = pq.ParquetWriter(file, schema)
+			writer.write_table(pa.Table.from_arrays([pa.array([], type=pa.string())], schema=schema))
+	finally:
+		if writer is not None:
+			writer.close()
+
+
+def parquet_available():
+	"""Check if the optional pyarrow dependency is installed."""
+	try:
+		import pyarrow.parquet
+	except ImportError:
+		return False
+	return True
+
+
+# Writer, content type, and file extension per format
+FORMATS = {
+	'xlsx': (write_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+	'csv': (write_csv, 'text/csv; charset=utf-8', 'csv'),
+	'ndjson': (write_ndjson, 'application/x-ndjson; charset=utf-8', 'ndjson'),
+	'parquet': (write_parquet, 'application/vnd.apache.parquet', 'parquet')
+}
+
+# Same for downloads of several tabs at once
+COURSE_FORMATS = {
+	'xlsx': (write_xlsx_sheets, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+	'csv': (write_csv_zip, 'application/zip', 'zip')
+}
+
+
+def _column_names(columns):
+	"""Column names from a cursor's description."""
+	return [column[0] for column in columns]
+
+
+def _arrow_schema(pa, columns):
+	"""Map a cursor's description to an Arrow schema."""
+	fields = []
+	for column in columns:
+		name, type_code = column[0], column[1]
+		if type_code in (FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG, FieldType.LONGLONG, FieldType.YEAR):
+			type_ = pa.int64()
+		elif type_code in (FieldType.FLOAT, FieldType.DOUBLE, FieldType.DECIMAL, FieldType.NEWDECIMAL):
+			type_ = pa.float64()
+		elif type_code in (FieldType.DATE, FieldType.NEWDATE):
+			type_ = pa.date32()
+		elif type_code in (FieldType.DATETIME, FieldType.TIMESTAMP):
+			type_ = pa.timestamp('us')
+		elif name.endswith(BILINGUAL_SUFFIXES):
+			type_ = pa.dictionary(pa.int32(), pa.string())
+		else:
+			type_ = pa.string()
+		fields.append(pa.field(name, type_))
+	return pa.schema(fields)
+
+
+def _arrow_array(pa, values, field):
+	"""Build a column of field's type from a chunk's values."""
+	if pa.types.is_dictionary(field.type):
+		return pa.array(_as_strings(values), type=pa.string()).dictionary_encode()
+	if pa.types.is_string(field.type):
+		return pa.array(_as_strings(values), type=pa.string())
+	if pa.types.is_floating(field.type):
+		values = [None if value is None else float(value) for value in values]
+	return pa.array(values, type=field.type)
+
+
+def _as_strings(values):
+	return [None if value is None else str(value) for value in values]
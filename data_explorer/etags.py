@@ -0,0 +1,75 @@
+import datetime
+import functools
+import hashlib
+import os
+from flask import current_app, request
+from data_explorer.cache import data_version
+
+# Suffixes of the ETags of compressed variants; see compression
+ENCODING_SUFFIXES = ('', '-gzip', '-br')
+
+# Identifies the deployed code and templates, as they also shape responses
+_build_id = None
+
+
+def conditional(view):
+	"""Decorator for GET views whose response depends only on the data
+	load, path, query args, and language. Their responses carry a strong
+	ETag derived from those, and a request whose If-None-Match holds it is
+	answered 304 without calling the view, and so without running queries.
+	
+	The date is part of the tag as some pages colour offerings relative to
+	today. Place below auth.login_required.
+	"""
+	@functools.wraps(view)
+	def wrapper(*args, **kwargs):
+		if request.method not in ('GET', 'HEAD'):
+			return view(*args, **kwargs)
+		tag = compute_etag()
+		# Match whichever variant, identity or compressed, the client holds
+		if any(request.if_none_match.contains_weak(tag + suffix) for suffix in ENCODING_SUFFIXES):
+			response = current_app.response_class(status=304)
+		else:
+			response = current_app.make_response(view(*args, **kwargs))
+			if response.status_code != 200:
+				return response
+		response.set_etag(tag)
+		# Responses differ by language cookie; always revalidate as the data
+		# may have been reloaded
+		response.vary.add('Cookie')
+		response.cache_control.private = True
+		response.cache_control.no_cache = True
+		return response
+	return wrapper
+
+
+def compute_etag():
+	"""Hash the data-load version, build, date, path, query args, and
+	language of the current request.
+	"""
+	lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
+	key = [
+		str(data_version()),
+		_get_build_id(),
+		datetime.date.today().isoformat(),
+		request.path,
+		sorted(request.args.items(multi=True)),
+		lang
+	]
+	return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:32]
+
+
+def _get_build_id():
+	"""Latest modification time of the package's code and templates, which
+	is the same in every process of a deployment.
+	"""
+	global _build_id
+	if _build_id is None:
+		latest = 0
+		for dir_path, dir_names, file_names in os.walk(current_app.root_path):
+			dir_names[:] = [dir_name for dir_name in dir_names if dir_name not in ('static', '__pycache__')]
+			for file_name in file_names:
+				if file_name.endswith(('.py', '.html', '.mo')):
+					latest = max(latest, os.path.getmtime(os.path.join(dir_path, file_name)))
+		_build_id = str(latest)
+	return _build_id
@@ -0,0 +1,156 @@
+import json
+import logging
+import re
+import sys
+import threading
+from flask import current_app, g, has_app_context, has_request_context, request
+
+# Structured log of statements slower than SLOW_QUERY_THRESHOLD_MS
+slow_query_log = logging.getLogger('data_explorer.slow_queries')
+
+
+class QueryStats:
+	"""Per-request collector of query count, DB time, and rows fetched.
+	Thread-safe so that worker threads loading parts of the same page can
+	report into the request that spawned them.
+	"""
+	def __init__(self):
+		self._lock = threading.Lock()
+		# List of tuples (tag, duration_ms, rows)
+		self.statements = []
+	
+	
+	def record(self, tag, duration_ms, rows):
+		with self._lock:
+			self.statements.append((tag, duration_ms, rows))
+	
+	
+	@property
+	def count(self):
+		return len(self.statements)
+	
+	
+	@property
+	def total_ms(self):
+		return sum(tup[1] for tup in self.statements)
+	
+	
+	@property
+	def rows(self):
+		return sum(tup[2] for tup in self.statements)
+	
+	
+	def by_tag(self):
+		"""Sum DB time per originating tag; return list sorted slowest first."""
+		totals = {}
+		for tag, duration_ms, rows in self.statements:
+			calls, total = totals.get(tag, (0, 0.0))
+			totals[tag] = (calls + 1, total + duration_ms)
+		return sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+	
+	
+	def server_timing(self, top_n):
+		"""Format as a Server-Timing header: overall DB time followed by
+		the top_n slowest query classes.
+		"""
+		metrics = ['db;dur={0:.1f};desc="{1} queries, {2} rows"'.format(self.total_ms, self.count, self.rows)]
+		for i, (tag, (calls, total)) in enumerate(self.by_tag()[:top_n], start=1):
+			desc = '{0} x{1}'.format(tag, calls) if calls > 1 else tag
+			metrics.append('db{0};dur={1:.1f};desc="{2}"'.format(i, total, desc))
+		return ', '.join(metrics)
+
+
+def get_stats():
+	"""Return the QueryStats for the current request, creating if needed."""
+	if 'query_stats' not in g:
+		g.query_stats = QueryStats()
+	return g.query_stats
+
+
+# Modules whose queries load data shared by several query classes; their
+# statements are tagged with the query class that asked for the data too
+SHARED_QUERY_MODULES = ('data_explorer.course_routes.queries.snapshot_queries',)
+# Modules through which query classes reach the shared modules' data
+_PASS_THROUGH_MODULES = SHARED_QUERY_MODULES + ('data_explorer.course_routes.utils', 'data_explorer.concurrency')
+
+
+def caller_tag(depth=2):
+	"""Name the query class or function that issued a query e.g.
+	'Learners._calc_top_depts'. depth counts frames up from the caller of
+	this function.
+	
+	Queries issued from SHARED_QUERY_MODULES are named after both the
+	first query class up the stack and the innermost public method of the
+	shared module that it called e.g. 'Learners._load via
+	LearnerSnapshot.top_counts', or the latter only if called from
+	elsewhere.
+	"""
+	frame = sys._getframe(depth)
+	if _module_name(frame) not in SHARED_QUERY_MODULES:
+		return _frame_name(frame)
+	shared = None
+	while frame is not None and _module_name(frame) in _PASS_THROUGH_MODULES:
+		if shared is None and _module_name(frame) in SHARED_QUERY_MODULES and not frame.f_code.co_name.startswith(('_', '<')):
+			shared = _frame_name(frame)
+		frame = frame.f_back
+	shared = shared or _frame_name(sys._getframe(depth))
+	if frame is None or not _module_name(frame).startswith('data_explorer.'):
+		return shared
+	return '{0} via {1}'.format(_frame_name(frame), shared)
+
+
+def _module_name(frame):
+	return frame.f_globals.get('__name__', '')
+
+
+def _frame_name(frame):
+	"""Class and function name of frame, or module and function name if not
+	in a method.
+	"""
+	func_name = frame.f_code.co_name
+	self_ = frame.f_locals.get('self')
+	if self_ is not None:
+		return '{0}.{1}'.format(type(self_).__name__, func_name)
+	cls = frame.f_locals.get('cls')
+	if isinstance(cls, type):
+		return '{0}.{1}'.format(cls.__name__, func_name)
+	module_name = _module_name(frame).rsplit('.', 1)[-1]
+	return '{0}.{1}'.format(module_name, func_name)
+
+
+def record_query(tag, query, duration_ms, rows):
+	"""Log a statement against the current request and, if slow, to the
+	slow query log.
+	"""
+	if not has_app_context():
+		return
+	get_stats().record(tag, duration_ms, rows)
+	if duration_ms >= current_app.config['SLOW_QUERY_THRESHOLD_MS']:
+		entry = {
+			'event': 'slow_query',
+			'tag': tag,
+			'duration_ms': round(duration_ms, 1),
+			'rows': rows,
+			'path': request.path if has_request_context() else None,
+			# Collapse whitespace of triple-quoted SQL; args omitted as may hold user input
+			'statement': _collapse_whitespace(query)[:500]
+		}
+		slow_query_log.warning(json.dumps(entry))
+
+
+def _collapse_whitespace(query):
+	return re.sub(r'\s+', ' ', query).strip()
+
+
+def _add_server_timing(response):
+	"""Attach the request's DB timings to the response."""
+	stats = g.get('query_stats')
+	if stats is not None and stats.count:
+		response.headers['Server-Timing'] = stats.server_timing(current_app.config['SERVER_TIMING_TOP_N'])
+	return response
+
+
+def init_app(app):
+	"""In factory function, register the Server-Timing header."""
+	if app.config['SERVER_TIMING']:
+		app.after_request(_add_server_timing)
@@ -2,18 +2,17 @@ from flask import Blueprint, make_response, render_template, redirect, request,
 from data_explorer import auth
 from data_explorer.config import Config
 from data_explorer.course_routes.queries import browse_queries
+from data_explorer.etags import conditional
 
 main = Blueprint('main', __name__)
 
 
-# Make Registhor API key available to all templates
+# Make Google Maps API key available to all templates
 GOOGLE_MAPS_API_KEY = Config.GOOGLE_MAPS_API_KEY
-REGISTHOR_API_KEY = Config.REGISTHOR_API_KEY
 @main.context_processor
 def context_processor():
 	return {
-		'GOOGLE_MAPS_API_KEY': GOOGLE_MAPS_API_KEY,
-		'REGISTHOR_API_KEY': REGISTHOR_API_KEY
+		'GOOGLE_MAPS_API_KEY': GOOGLE_MAPS_API_KEY
 	}
 
 
@@ -31,11 +30,11 @@ def about():
 # Browse
 @main.route('/browse')
 @auth.login_required
+@conditional
 def browse():
 	# Only allow 'en' and 'fr' to be passed to app
 	lang = 'fr' if request.cookies.get('lang', None) == 'fr' else 'en'
-	course_list = browse_queries.CourseList(lang).load()
-	pass_dict = course_list._get_nested_dicts()
+	pass_dict = browse_queries.nested_courses(lang)
 	return render_template('browse/browse.html', pass_dict=pass_dict)
 
 
@@ -0,0 +1,92 @@
+import datetime
+import decimal
+import json
+from flask import current_app, has_app_context
+
+
+def default(obj):
+	"""Serialize types coming out of MySQL and the query classes that json
+	doesn't handle natively: dates as ISO 8601, Decimals as floats, and
+	NumPy scalars and arrays as their Python equivalents. NumPy is detected
+	without importing it.
+	"""
+	if isinstance(obj, (datetime.date, datetime.datetime, datetime.time)):
+		return obj.isoformat()
+	if isinstance(obj, decimal.Decimal):
+		return float(obj)
+	if type(obj).__module__ == 'numpy' and hasattr(obj, 'tolist'):
+		return obj.tolist()
+	raise TypeError('Object of type {0} is not JSON serializable'.format(type(obj).__name__))
+
+
+def _json_dumps(obj, pretty=False):
+	if pretty:
+		text = json.dumps(obj, ensure_ascii=False, indent=2, default=default)
+	else:
+		text = json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=default)
+	return text.encode('utf-8')
+
+
+def _orjson_dumps(obj, pretty=False):
+	import orjson
+	# Keys may be ints e.g. comment counts by star
+	option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+	if pretty:
+		option |= orjson.OPT_INDENT_2
+	return orjson.dumps(obj, default=default, option=option)
+
+
+def orjson_available():
+	"""Check if the optional orjson dependency is installed."""
+	try:
+		import orjson
+	except ImportError:
+		return False
+	return True
+
+
+# Functions serializing an object to UTF-8 JSON bytes, by name
+BACKENDS = {
+	'json': _json_dumps,
+	'orjson': _orjson_dumps
+}
+
+
+# Backend picked by 'auto', resolved on first use
+_auto_backend = None
+
+
+def get_backend(name=None):
+	"""Return the dumps function named by name, default config JSON_BACKEND.
+	'auto' picks orjson if installed, else the standard library's json.
+	"""
+	global _auto_backend
+	if name is None:
+		name = current_app.config['JSON_BACKEND'] if has_app_context() else 'auto'
+	if name == 'auto':
+		if _auto_backend is None:
+			_auto_backend = 'orjson' if orjson_available() else 'json'
+		name = _auto_backend
+	return BACKENDS[name]
+
+
+def dumps_bytes(obj, pretty=False):
+	"""Serialize obj to UTF-8 JSON bytes with the configured backend."""
+	return get_backend()(obj, pretty)
+
+
+def dumps(obj, pretty=False):
+	"""Serialize obj to a JSON str with the configured backend."""
+	return dumps_bytes(obj, pretty).decode('utf-8')
+
+
+def jsonify(*args, **kwargs):
+	"""Drop-in for flask.jsonify using the configured backend. Indented if
+	JSONIFY_PRETTYPRINT_REGULAR is set or in debug mode, else compact.
+	"""
+	if args and kwargs:
+		raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+	data = args[0] if len(args) == 1 else (args or kwargs)
+	pretty = current_app.config['JSONIFY_PRETTYPRINT_REGULAR'] or current_app.debug
+	body = dumps_bytes(data, pretty) + b'\n'
+	return current_app.response_class(body, mimetype=current_app.config['JSONIFY_MIMETYPE'])
@@ -0,0 +1,64 @@
+import logging
+import sys
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger('data_explorer.startup')
+
+# Dependencies slow to import, which should only load when first needed
+HEAVY_MODULES = ('pandas', 'numpy', 'xlsxwriter', 'pyarrow')
+
+
+class StartupReport:
+	"""Times the stages of create_app, such as importing each blueprint,
+	and logs them to 'data_explorer.startup' along with which heavy modules
+	were loaded, then logs the time to the first response.
+	
+	Import times are cumulative: a module shared by two blueprints counts
+	towards whichever is imported first. Run `python -X importtime
+	application.py` for a breakdown by module.
+	"""
+	def __init__(self):
+		self.started_at = time.perf_counter()
+		# List of tuples (stage, duration_ms, modules_loaded)
+		self.stages = []
+		self._first_response_seen = False
+	
+	
+	@contextmanager
+	def stage(self, name):
+		"""Time the enclosed block and count the modules it imported."""
+		start = time.perf_counter()
+		module_count = len(sys.modules)
+		try:
+			yield
+		finally:
+			duration_ms = (time.perf_counter() - start) * 1000
+			self.stages.append((name, duration_ms, len(sys.modules) - module_count))
+	
+	
+	def summary(self):
+		"""Format stages, total, and loaded heavy modules as a single entry."""
+		total_ms = (time.perf_counter() - self.started_at) * 1000
+		lines = ['App created in {0:.1f} ms'.format(total_ms)]
+		for name, duration_ms, modules_loaded in self.stages:
+			lines.append('  {0:<40} {1:>8.1f} ms  (+{2} modules)'.format(name, duration_ms, modules_loaded))
+		loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+		lines.append('  Heavy modules loaded: {0}'.format(', '.join(loaded) if loaded else 'none'))
+		return '\n'.join(lines)
+	
+	
+	def init_app(self, app):
+		"""In factory function, log the summary and register the log of the
+		first response's timing.
+		"""
+		log.info(self.summary())
+		app.after_request(self._log_first_response)
+	
+	
+	def _log_first_response(self, response):
+		if not self._first_response_seen:
+			self._first_response_seen = True
+			log.info('First response %.1f ms after app creation started',
+					 (time.perf_counter() - self.started_at) * 1000)
+		return response